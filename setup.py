@@ -21,6 +21,10 @@ setup(
         'six==1.11.0',
         'xlrd2==1.3.4'
     ],
+    extras_require={
+        'numpy': ['numpy'],
+        'bench': ['xlwt'],
+    },
     platform="any",
     zip_safe=False,
     include_package_data=True,
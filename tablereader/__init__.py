@@ -11,42 +11,314 @@
 
 #
 # Python imports
+from collections import OrderedDict
 from datetime import datetime
+from functools import partial
+import codecs
 import csv
+import io
+from itertools import chain, islice
+import locale
+import mmap
+import multiprocessing
+import operator
+import os
+import zipfile
 
 #
 # environment imports
 import openpyxl
 import openpyxl.cell.cell
-from six import next as six_next, PY2, string_types as six_string_types
+from six import integer_types as six_integer_types, next as six_next, PY2, string_types as six_string_types
+from six.moves import range, zip
 import xlrd2
 
 #
 # local imports
 import tablereader._csv_from_pypy as _csv
+from tablereader._columns import build_columns, to_records
+from tablereader._row_index import INDEX_SUFFIX, RowIndex
+from tablereader._sheet_cache import CachedSheetReader, SheetCache
+from tablereader._stats import clock as stats_clock, ReaderStats, StatsReader
+import tablereader._workbook_cache as _workbook_cache
+from tablereader._workbook_cache import WorkbookCache, workbook_cache
+from tablereader._writer import TableWriter
+from tablereader._xlsx_stream import XLSXStreamReader
+if not PY2:
+    from tablereader._async import AsyncTableReader  # needs the async syntax of Python 3.5
 
 #
 # constants
 CLEAR_STRING = ""  # used to speed up processing in pypy, has no functional meaning
+XL_NUMERIC_TYPES = (xlrd2.XL_CELL_NUMBER, xlrd2.XL_CELL_DATE)  # xlrd cell types holding floats
+XL_EMPTY_TYPES = (xlrd2.XL_CELL_EMPTY, xlrd2.XL_CELL_BLANK)
+OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"  # xls, and other compound documents
+ZIP_MAGIC = b"PK\x03\x04"  # xlsx, if it contains a workbook part
+XLSX_EXTENSIONS = (".xlsx", ".xlsm", ".xltx", ".xltm")
+SNIFF_SIZE = 64 * 1024  # characters of a CSV file looked at to guess delimiter and quotechar
+SNIFF_DELIMITERS = ";,\t|"
+HEADER_OFFSETS_SIZE = 1024  # entries kept by OffsetTableReader for files opened before
+ROW_CLASSES_SIZE = 1024  # Row subclasses kept by row_class() for fieldnames seen before
+BOMS = ((codecs.BOM_UTF32_LE, "utf-32"), (codecs.BOM_UTF32_BE, "utf-32"),  # UTF-32 LE starts like UTF-16 LE, check it first
+        (codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+ENCODING_SAMPLE_SIZE = 64 * 1024  # bytes of a CSV file without BOM checked for being UTF-8
+FALLBACK_ENCODING = "cp1252"  # assumed by encoding="auto" if the sample is no valid UTF-8
+DECODE_CHUNK_SIZE = 1024 * 1024  # bytes of a CSV file decoded at once
+MMAP_WINDOW_SIZE = 1024 * 1024  # bytes of a CSV file mapped at once by use_mmap, a multiple of mmap.ALLOCATIONGRANULARITY
+ASCII_PROBE = b"\n\r\t ;,|\"'"  # bytes looked for by the byte level CSV readers
+
+_header_offsets = {}  # file fingerprint and header search options to the number of rows before the header
+_row_classes = {}  # fieldnames to their Row subclass
 
 __version__ = "1.1.1"
 
 
+def _detect_type(filename, filehandle):
+    """Guess "xls", "xlsx" or "csv" from the magic bytes of a file opened in binary mode, then from its extension"""
+
+    magic = filehandle.read(len(OLE2_MAGIC))
+    if magic == OLE2_MAGIC:
+        return "xls"
+    if magic.startswith(ZIP_MAGIC):
+        try:
+            archive = zipfile.ZipFile(filehandle)
+        except zipfile.BadZipfile:
+            pass
+        else:
+            if "xl/workbook.xml" in archive.namelist():
+                return "xlsx"
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    elif extension == ".xls":
+        return "xls"
+    elif extension in XLSX_EXTENSIONS:
+        return "xlsx"
+    return None
+
+
+def _detect_encoding(filehandle):
+    """Encoding of a binary file from its BOM, else UTF-8 if a sample decodes as such, else FALLBACK_ENCODING"""
+
+    filehandle.seek(0)
+    sample = filehandle.read(ENCODING_SAMPLE_SIZE)
+    filehandle.seek(0)
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        # a multibyte character may be cut off at the end of the sample
+        codecs.getincrementaldecoder("utf-8")().decode(sample, len(sample) < ENCODING_SAMPLE_SIZE)
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+    return "utf-8"
+
+
+def _byte_encoding(encoding):
+    """Codec to encode delimiter and quote characters with for parsing bytes of encoding
+
+    Raises ValueError if encoding is not ASCII compatible, like UTF-16.
+    """
+
+    if ASCII_PROBE.decode(encoding, "replace") != ASCII_PROBE.decode("ascii"):
+        raise ValueError("Encoding %s is not ASCII compatible, the file needs to be read as text" % encoding)
+    if codecs.lookup(encoding).name == "utf-8-sig":
+        return "utf-8"  # the BOM is skipped by decoding the first field, it must not be part of encoded delimiters
+    return encoding
+
+
+def _decoded_lines(filehandle, encoding, chunk_size=DECODE_CHUNK_SIZE):
+    """Lines of a binary file, decoded chunk by chunk, with line breaks translated to \\n like text mode does"""
+
+    return _decoded_block_lines(iter(partial(filehandle.read, chunk_size), b""), encoding)
+
+
+def _mapped_lines(filehandle, encoding, window_size=MMAP_WINDOW_SIZE):
+    """Lines of a binary file, mapped into memory window by window, otherwise like _decoded_lines
+
+    Every window is unmapped again once its bytes are copied out, so only about one window of the file is resident
+    however large it is.
+    """
+
+    return _decoded_block_lines(_mapped_windows(filehandle, window_size), encoding)
+
+
+def _mapped_windows(filehandle, window_size):
+    """Bytes of a file in blocks of window_size, each copied out of a mapping of its own"""
+
+    fileno = filehandle.fileno()
+    size = os.fstat(fileno).st_size  # empty files cannot be mapped, they have no windows
+    for start in range(0, size, window_size):
+        window = mmap.mmap(fileno, min(window_size, size - start), access=mmap.ACCESS_READ, offset=start)
+        try:
+            block = window[:]
+        finally:
+            window.close()
+        filehandle.seek(start + len(block))  # the position tells how much of the file was read, e.g. for stats
+        yield block
+
+
+def _decoded_block_lines(blocks, encoding):
+    """Lines of consecutive byte blocks, each decoded at once, with line breaks translated to \\n like text mode does"""
+
+    return chain.from_iterable(_decoded_line_lists(blocks, encoding))
+
+
+def _decoded_line_lists(blocks, encoding):
+    """Lists of the complete lines of consecutive byte blocks, one list per block"""
+
+    decoder = codecs.getincrementaldecoder(encoding)()
+    tail = ""  # incomplete last line of the previous chunk
+    for block in chain(blocks, [b""]):
+        text = tail + decoder.decode(block, not block)
+        if block and text.endswith("\r"):
+            text, tail = text[:-1], "\r"  # a \r\n may be cut in half
+        else:
+            tail = ""
+        lines = io.StringIO(text, newline=None).readlines()
+        if block and lines and not lines[-1].endswith("\n"):
+            tail = lines.pop() + tail
+        yield lines
+
+
+def decimal_comma(value):
+    """Convert a number written with decimal comma like "1.234,5" into a float"""
+
+    return float(value.replace(".", "").replace(",", "."))
+
+
+class Row(tuple):
+    """Compact row, a tuple also allowing access by column name like row['column']
+
+    Use row_class() to get a subclass for a list of fieldnames, all its instances
+    share one fieldname to index map instead of carrying a dict each. Like a dict,
+    unknown column names raise KeyError and "in" checks column names, but iterating
+    yields the values like a tuple does.
+    """
+
+    __slots__ = ()
+    _fields = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        try:
+            return tuple.__getitem__(self, self._index[key])
+        except KeyError:
+            if isinstance(key, six_integer_types):
+                return tuple.__getitem__(self, key)
+            raise
+        except TypeError:  # unhashable, like a slice
+            return tuple.__getitem__(self, key)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def get(self, key, default=None):
+        index = self._index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    def keys(self):
+        return list(self._fields)
+
+    def values(self):
+        return list(self)
+
+    def items(self):
+        return list(zip(self._fields, self))
+
+    def _asdict(self):
+        return OrderedDict(zip(self._fields, self))
+
+    def __reduce__(self):
+        # the subclasses of row_class() are not found by name, rows are rebuilt from fieldnames and values
+        return _make_row, (tuple(self._fields), tuple(self))
+
+
+def row_class(fieldnames):
+    """Row subclass for the given fieldnames, the same one for fieldnames seen before"""
+
+    fields = tuple(fieldnames)
+    cls = _row_classes.get(fields)
+    if cls is None:
+        if len(_row_classes) >= ROW_CLASSES_SIZE:
+            _row_classes.clear()
+        cls = _row_classes[fields] = type("Row", (Row,), {
+            "__slots__": (),
+            "_fields": fields,
+            "_index": dict((name, index) for index, name in enumerate(fields)),
+        })
+    return cls
+
+
+def _make_row(fields, values):
+    """Row of fields holding values, module level so pickle can find it"""
+
+    return row_class(fields)(values)
+
+
+def _open_xls(filename, on_demand=True):
+    """xlrd book of filename and the function closing it, as WorkbookCache expects from an opener"""
+
+    book = xlrd2.open_workbook(filename, on_demand=on_demand)
+    return book, book.release_resources
+
+
+def _open_xlsx(filename):
+    """openpyxl read-only book of filename and the function closing it, as WorkbookCache expects from an opener"""
+
+    if os.path.splitext(filename)[1].lower() in XLSX_EXTENSIONS:
+        book = openpyxl.load_workbook(filename, read_only=True)
+        return book, book.close
+    # openpyxl refuses file names with other extensions, but takes file objects
+    filehandle = open(filename, "rb")
+    try:
+        book = openpyxl.load_workbook(filehandle, read_only=True)
+    except Exception:
+        filehandle.close()
+        raise
+
+    def close():
+        book.close()
+        filehandle.close()
+    return book, close
+
+
 class BaseXLReader(object):
-    """Mimic _csv.reader interface for DictReader to be able to handle an xls sheet"""
+    """Mimic _csv.reader interface for DictReader to be able to handle an xls sheet
+
+    Rows are converted in blocks of block_size through column-wise access. With
+    on_demand, only the requested sheet is loaded and it gets unloaded again once
+    iteration finishes. With typed, cells are returned as native values instead of strings.
+    The workbook is taken from workbook_cache, defaulting to the one shared by the process.
+    """
 
-    def __init__(self, filename, sheetname=None):
+    block_size = 1024
+
+    def __init__(self, filename, sheetname=None, on_demand=True, typed=False, workbook_cache=None):
         self.line_num = 0
         self.filename = filename
         self.sheetname = sheetname
-        self._reader = xlrd2.open_workbook(filename)
+        self.on_demand = on_demand
+        self.typed = typed
+        self._books = workbook_cache if workbook_cache is not None else _workbook_cache.workbook_cache
+        self._reader = self._books.acquire(filename, "xls", partial(_open_xls, filename, on_demand), on_demand)
         self.sheetnames = self._reader.sheet_names()
-        if sheetname is None:
-            self._sheet = self._reader.sheet_by_index(0)
-        else:
-            if sheetname not in self.sheetnames:
+        try:
+            if sheetname is not None and sheetname not in self.sheetnames:
                 raise ValueError("No such sheet %s" % sheetname)
-            self._sheet = self._reader.sheet_by_name(sheetname)
+            with self._books.lock:  # loading a sheet moves the shared book's read position
+                if sheetname is None:
+                    self._sheet = self._reader.sheet_by_index(0)
+                else:
+                    self._sheet = self._reader.sheet_by_name(sheetname)
+        except Exception:
+            self._books.release(self._reader)
+            raise
+        self.nrows = self._sheet.nrows
+        self._columns = None
+        self._strip = None  # True or column indices to strip whitespace of
+        self._block = []
+        self._block_start = 0
 
     def __iter__(self):
         return self
@@ -55,40 +327,172 @@ class BaseXLReader(object):
         return self.next()
 
     def next(self):
-        try:
-            items = self.stringified_row()
-        except IndexError:
+        if self.line_num >= self.nrows:
+            self.release()
             raise StopIteration
+        items = self.stringified_row()
         self.line_num += 1
         return items
 
+    def stringified_row(self):
+        """Ensure row contents are all strings"""
+
+        offset = self.line_num - self._block_start
+        if not 0 <= offset < len(self._block):
+            self._load_block(self.line_num)
+            offset = 0
+        return self._block[offset]
+
+    def select_columns(self, indices):
+        """Only read and convert the columns at indices from now on, in that order"""
+
+        self._columns = list(indices)
+        self._block = []
+
+    def set_strip(self, indices=None):
+        """Strip whitespace off string cells of the columns at indices, or of all columns if None, when converting them"""
+
+        self._strip = True if indices is None else frozenset(indices)
+        self._block = []
+
+    def strip_column(self, values):
+        return [value.strip() if isinstance(value, six_string_types) else value for value in values]
+
+    def find_header(self, matches, max_rows=None):
+        """Move to the first row holding a cell for which matches is true and return the number of rows passed
+
+        Searched column by column, each column only up to the row found so far. Returns None if no cell matches.
+        """
+
+        sheet = self._sheet
+        convert = self.typed_column if self.typed else self.stringified_column
+        start = self.line_num
+        found = self.nrows if max_rows is None else min(self.nrows, start + max_rows)
+        end = found
+        for colx in range(sheet.ncols):
+            if found <= start:
+                break
+            values = convert(sheet.col_values(colx, start, found), sheet.col_types(colx, start, found))
+            if self._strip is not None and (self._strip is True or colx in self._strip):
+                values = self.strip_column(values)
+            for offset, value in enumerate(values):
+                if matches(value):
+                    found = start + offset
+                    break
+        if found == end:
+            return None
+        self.line_num = found
+        return found - start
+
+    def restrict(self, skip, count=None):
+        """Skip the next skip rows and stop after count more rows, rows are indexed directly"""
+
+        self.line_num = min(self.line_num + skip, self.nrows)
+        if count is not None:
+            self.nrows = min(self.nrows, self.line_num + count)
+
+    def _load_block(self, start):
+        end = min(start + self.block_size, self.nrows)
+        sheet = self._sheet
+        convert = self.typed_column if self.typed else self.stringified_column
+        colxs = range(sheet.ncols) if self._columns is None else self._columns
+        columns = [convert(sheet.col_values(colx, start, end), sheet.col_types(colx, start, end))
+                   for colx in colxs]
+        strip = self._strip
+        if strip is not None:
+            columns = [self.strip_column(column) if strip is True or colx in strip else column
+                       for colx, column in zip(colxs, columns)]
+        if columns:
+            self._block = [list(row) for row in zip(*columns)]
+        else:
+            self._block = [[] for _ in range(start, end)]
+        self._block_start = start
+
+    def column_blocks(self, block_size=None):
+        """Yield the remaining rows as lists of native column values, block_size rows at a time, without building rows
+
+        Columns holding numbers only are passed on as xlrd2 returns them, as floats.
+        """
+
+        sheet = self._sheet
+        colxs = range(sheet.ncols) if self._columns is None else self._columns
+        strip = self._strip
+        while self.line_num < self.nrows:
+            start = self.line_num
+            end = min(start + (block_size or self.block_size), self.nrows)
+            columns = []
+            for colx in colxs:
+                values = sheet.col_values(colx, start, end)
+                types = sheet.col_types(colx, start, end)
+                if any(celltype != xlrd2.XL_CELL_NUMBER for celltype in types):
+                    values = self.typed_column(values, types)
+                    if strip is not None and (strip is True or colx in strip):
+                        values = self.strip_column(values)
+                columns.append(values)
+            self.line_num = end
+            yield columns
+        self.release()
+
+    @property
+    def column_count(self):
+        return self._sheet.ncols if self._columns is None else len(self._columns)
+
+    def typed_column(self, values, types):
+        """Convert column contents to native values, integral numbers become int"""
+
+        datemode = self._reader.datemode
+        column = []
+        for value, celltype in zip(values, types):
+            if celltype == xlrd2.XL_CELL_NUMBER:
+                if value.is_integer():
+                    value = int(value)
+            elif celltype == xlrd2.XL_CELL_DATE:
+                value = xlrd2.xldate_as_datetime(value, datemode)
+            elif celltype == xlrd2.XL_CELL_BOOLEAN:
+                value = bool(value)
+            elif celltype == xlrd2.XL_CELL_ERROR:
+                value = xlrd2.error_text_from_code.get(value, value)
+            elif celltype in XL_EMPTY_TYPES:
+                value = None
+            column.append(value)
+        return column
+
+    def release(self):
+        """Drop the loaded sheet and hand the workbook back, further reads are not possible afterwards"""
+
+        self._block = []
+        if self._sheet is not None:
+            if self.on_demand:
+                with self._books.lock:
+                    self._reader.unload_sheet(self._sheet.name)
+            self._books.release(self._reader)
+        self._sheet = None
+
+    def close(self):
+        self.release()
+
+    def __del__(self):
+        if getattr(self, "_sheet", None) is not None:
+            self.release()
+
 
 class XLReaderPy2(BaseXLReader):
 
-    def stringified_row(self):
-        """Ensure row contents are all strings"""
+    def stringified_column(self, values, types):
+        """Ensure column contents are all strings"""
 
-        row = self._sheet.row_values(self.line_num)
-        newrow = []
-        for element in row:
-            if isinstance(element, float):
-                element = str(element)
-            newrow.append(unicode(element) if not isinstance(element, unicode) else element)
-        return newrow
+        return [unicode(str(value)) if celltype in XL_NUMERIC_TYPES else
+                value if isinstance(value, unicode) else unicode(value)
+                for value, celltype in zip(values, types)]
 
 
 class XLReaderPy3(BaseXLReader):
 
-    def stringified_row(self):
-        """Ensure row contents are all strings"""
+    def stringified_column(self, values, types):
+        """Ensure column contents are all strings"""
 
-        row = self._sheet.row_values(self.line_num)
-        newrow = []
-        for element in row:
-            if isinstance(element, float):
-                element = str(element)
-            newrow.append(element)
-        return newrow
+        return [str(value) if celltype in XL_NUMERIC_TYPES else value
+                for value, celltype in zip(values, types)]
 
 
 if PY2:
@@ -98,20 +502,32 @@ else:
 
 
 class XLSXReader(object):
-    """Mimic _csv.reader interface for DictReader to be able to handle an xlsx sheet"""
+    """Mimic _csv.reader interface for DictReader to be able to handle an xlsx sheet
 
-    def __init__(self, filename, sheetname=None):
+    The workbook is taken from workbook_cache, defaulting to the one shared by the process,
+    and handed back once iteration finishes or on close().
+    """
+
+    def __init__(self, filename, sheetname=None, typed=False, workbook_cache=None):
         self.line_num = 0
         self.filename = filename
         self.sheetname = sheetname
-        self._reader = openpyxl.load_workbook(filename, read_only=True)
+        self.typed = typed
+        self._books = workbook_cache if workbook_cache is not None else _workbook_cache.workbook_cache
+        self._reader = self._books.acquire(filename, "xlsx", partial(_open_xlsx, filename))
         self.sheetnames = self._reader.sheetnames
         if sheetname is None:
             self._sheet = self._reader[self.sheetnames[0]]
+        elif sheetname in self.sheetnames:
+            self._sheet = self._reader[sheetname]
         else:
-            self._sheet = self._reader.get_sheet_by_name(sheetname)
-            if self._sheet is None:
-                raise ValueError("No such sheet %s" % sheetname)
+            self._books.release(self._reader)
+            self._reader = None
+            raise ValueError("No such sheet %s" % sheetname)
+        self._columns = None
+        self._strip = None  # True or positions in the returned rows to strip whitespace of
+        self._strip_columns = None  # same as column indices
+        self._min_col = self._max_col = self._max_row = None
         self._iter = self._sheet.iter_rows()
 
     def __iter__(self):
@@ -121,40 +537,298 @@ class XLSXReader(object):
         return self.next()
 
     def next(self):
-        items = self.stringified_row()
+        try:
+            items = self.stringified_row()
+        except StopIteration:
+            self.close()  # hand the workbook back
+            raise
         self.line_num += 1
         return items
 
     def stringified_row(self):
         """Ensure row contents are all strings"""
 
-        row = six_next(self._iter)
+        return self.stringify(six_next(self._iter))
+
+    def stringify(self, row):
+        """Convert a row of openpyxl cells to their values"""
+
+        if self._columns is not None:
+            row = [row[index] for index in self._columns]
+        strip = self._strip
+        if self.typed:
+            if strip is None:
+                return [element.value for element in row]
+            return [element.value.strip() if (strip is True or position in strip) and isinstance(element.value, six_string_types)
+                    else element.value for position, element in enumerate(row)]
         newrow = []
-        for element in row:
+        for position, element in enumerate(row):
             if element.value is not None:
                 if isinstance(element.value, datetime):
                     element = str(element.value)
-                elif element.data_type is openpyxl.cell.cell.TYPE_NUMERIC:
+                elif element.data_type == openpyxl.cell.cell.TYPE_NUMERIC:
                     element = str(element.value)
                 else:
                     element = element.value
+                    if strip is not None and (strip is True or position in strip) and isinstance(element, six_string_types):
+                        element = element.strip()
             else:
                 element = CLEAR_STRING
             newrow.append(element)
         return newrow
 
+    def set_strip(self, indices=None):
+        """Strip whitespace off string cells of the columns at indices, or of all columns if None, when converting them"""
+
+        self._strip_columns = True if indices is None else frozenset(indices)
+        self._update_strip()
+
+    def _update_strip(self):
+        """Map the columns to strip to positions in the rows returned"""
+
+        if self._strip_columns is None or self._strip_columns is True:
+            self._strip = self._strip_columns
+        elif self._columns is None:
+            self._strip = self._strip_columns
+        else:
+            first = self._min_col - 1
+            self._strip = frozenset(position for position, offset in enumerate(self._columns)
+                                    if first + offset in self._strip_columns)
+
+    def select_columns(self, indices):
+        """Only read and convert the cells at indices from now on, in that order
+
+        Restarts the sheet parser behind the current row, limited to the column range of indices.
+        """
+
+        first = min(indices)
+        self._columns = [index - first for index in indices]
+        self._min_col, self._max_col = first + 1, max(indices) + 1
+        self._update_strip()
+        self._restart()
+
+    def restrict(self, skip, count=None):
+        """Skip the next skip rows and stop after count more rows, without parsing any row beyond"""
+
+        self.line_num += skip
+        if self._sheet.max_row is not None:
+            self.line_num = min(self.line_num, self._sheet.max_row)
+        if count is not None:
+            self._max_row = self.line_num + count
+        self._restart()
 
-class CSVStrippingReader(object):
-    """Patches CSV reader to allow for whitespace stripping"""
+    def _restart(self):
+        """Restart the sheet parser behind the current row, limited to the current row and column range"""
+
+        self._iter.close()
+        self._iter = self._sheet.iter_rows(min_row=self.line_num + 1, max_row=self._max_row,
+                                           min_col=self._min_col, max_col=self._max_col)
+
+    def close(self):
+        self._iter.close()
+        if self._reader is not None:
+            self._books.release(self._reader)
+            self._reader = None
+
+    def __del__(self):
+        if getattr(self, "_reader", None) is not None:
+            self.close()
 
-    def __init__(self, reader):
+
+class StrippingReader(object):
+    """Mimic _csv.reader interface, stripping whitespace off reader's rows
+
+    Fallback for backends unable to strip while converting cells, like cached sheets.
+    """
+
+    def __init__(self, reader, indices=None):
         self.reader = reader
+        self.indices = None if indices is None else sorted(indices)
+
+    @property
+    def line_num(self):
+        return self.reader.line_num
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def next(self):
+        return self.strip(six_next(self.reader))
+
+    def strip(self, row):
+        return _strip_row(row, self.indices)
+
+    def close(self):
+        backend_close = getattr(self.reader, "close", None)
+        if backend_close is not None:
+            backend_close()
+
+
+CSVStrippingReader = StrippingReader  # former name, kept for backwards compatibility
+
+
+def _strip_row(row, indices=None):
+    """Strip whitespace off the string entries of row at indices, or all of them if None"""
+
+    if indices is None:
+        return [entry.strip() if isinstance(entry, six_string_types) else entry for entry in row]
+    row = list(row)
+    count = len(row)
+    for index in indices:
+        if index < count and isinstance(row[index], six_string_types):
+            row[index] = row[index].strip()
+    return row
+
+
+class ProjectingReader(object):
+    """Mimic _csv.reader interface, passing on only the fields at indices of reader's rows
+
+    Used for backends unable to skip columns by themselves. Fields missing in short rows become None.
+    """
+
+    def __init__(self, reader, indices):
+        self.reader = reader
+        self.indices = list(indices)
+
+    @property
+    def line_num(self):
+        return self.reader.line_num
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def next(self):
+        row = six_next(self.reader)
+        if not row:
+            return row
+        count = len(row)
+        return [row[index] if index < count else None for index in self.indices]
+
+    def close(self):
+        backend_close = getattr(self.reader, "close", None)
+        if backend_close is not None:
+            backend_close()
+
+
+def _skip_rows(reader, count):
+    """Pass over the next count rows of reader, as cheap as the reader allows"""
+
+    if hasattr(reader, "restrict"):
+        reader.restrict(count)
+    elif hasattr(reader, "skip"):
+        reader.skip(count)
+    else:
+        for _ in range(count):
+            six_next(reader)
+
+
+class RowRangeReader(object):
+    """Mimic _csv.reader interface, skipping the first skip rows of reader and stopping after count more
+
+    Rows are skipped through the reader's skip() if it has one, e.g. to pass over lines without splitting them.
+    """
+
+    def __init__(self, reader, skip, count=None):
+        self.reader = reader
+        self.remaining = count
+        try:
+            _skip_rows(reader, skip)
+        except StopIteration:
+            self.remaining = 0
 
     def __getattr__(self, name):
         if name == "reader":
-            return self.reader
+            raise AttributeError(name)
+        return getattr(self.reader, name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def next(self):
+        if self.remaining is not None:
+            if self.remaining <= 0:
+                raise StopIteration
+            self.remaining -= 1
+        return six_next(self.reader)
+
+
+class ResumableLines(object):
+    """Iterate the decoded lines of a file opened in binary mode, keeping the byte offset behind the last record
+
+    Lines are only passed on once their record is complete, that is it does not end within a quoted field. As in
+    the parser, a quote character only opens a quoted field at the start of a field. A record lacking its final
+    line break is held back, it may still be written to. Iterating again after more data got appended continues
+    with it. The encoding must be ASCII compatible.
+    """
+
+    def __init__(self, filehandle, encoding, delimiter, quotechar, offset=0):
+        self.offset = offset  # behind the last record passed on
+        self.encoding = encoding
+        self._file = filehandle
+        self._delimiter = delimiter.encode(_byte_encoding(encoding))
+        self._quote = quotechar.encode(_byte_encoding(encoding)) if quotechar else None
+        self._lines = []  # decoded lines of the current record, in reverse order
+        filehandle.seek(offset)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def next(self):
+        if not self._lines:
+            self._read_record()
+        return self._lines.pop()
+
+    def _read_record(self):
+        lines = []
+        quoted = False
+        while True:
+            line = self._file.readline()
+            if not line.endswith(b"\n"):
+                self._file.seek(self.offset)  # incomplete, read it again next time
+                raise StopIteration
+            if self._quote and self._quote in line:
+                first = len(codecs.BOM_UTF8) if not self.offset and not lines and line.startswith(codecs.BOM_UTF8) else 0
+                quoted = _csv._ends_quoted(line, self._delimiter, self._quote, quoted, first=first)
+            lines.append(line)
+            if not quoted:
+                break
+        self.offset += sum(len(line) for line in lines)
+        self._lines = [line.decode(self.encoding) for line in reversed(lines)]
+
+
+class MMapCSVReader(object):
+    """Mimic _csv.reader interface on a CSV file mapped into memory window by window
+
+    The lines of _mapped_lines() are parsed like reading through a file handle does, by the C csv reader for
+    kind "csv" and by ScanningReader for "unicodecsv". TableReader(use_mmap=True) hands them to its parser directly.
+    """
+
+    def __init__(self, filename, encoding=None, delimiter=";", quotechar='"', kind="unicodecsv",
+                 window_size=MMAP_WINDOW_SIZE):
+        self.filename = filename
+        self.encoding = encoding or locale.getpreferredencoding(False)
+        self._file = open(filename, "rb")
+        lines = _mapped_lines(self._file, self.encoding, window_size)
+        if kind == "csv" and not PY2:
+            self._reader = csv.reader(lines, delimiter=delimiter, quotechar=quotechar)
         else:
-            return getattr(self.reader, name)
+            self._reader = _csv.ScanningReader(lines, delimiter=delimiter, quotechar=quotechar)
+
+    @property
+    def line_num(self):
+        return self._reader.line_num
 
     def __iter__(self):
         return self
@@ -163,21 +837,221 @@ class CSVStrippingReader(object):
         return self.next()
 
     def next(self):
-        row = self.reader.next()
-        return [entry.strip() for entry in row]
+        return six_next(self._reader)
+
+    def close(self):
+        self._file.close()
+
+
+def _csv_chunk_ranges(filename, chunk_size, delimiter, quotechar, encoding):
+    """Split a CSV file into (start, end, first line) byte ranges of about chunk_size
+
+    A range ends on a line break outside of quoted fields. Quote characters only open a quoted field at the
+    start of a field, as in the parser, so stray quotes within unquoted fields do not move the boundaries.
+    """
+
+    byte_encoding = _byte_encoding(encoding)
+    quote = quotechar.encode(byte_encoding) if quotechar else None
+    delimiter = delimiter.encode(byte_encoding)
+    ranges = []
+    with open(filename, "rb") as filehandle:
+        size = os.fstat(filehandle.fileno()).st_size
+        if not size:
+            return ranges  # empty files cannot be mapped
+        buf = mmap.mmap(filehandle.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            first = 0  # where the first field starts
+            if codecs.lookup(encoding).name == "utf-8-sig" and buf[:len(codecs.BOM_UTF8)] == codecs.BOM_UTF8:
+                first = len(codecs.BOM_UTF8)
+            start = first_line = 0  # current range
+            while start < size:
+                end = buf.find(b"\n", min(start + chunk_size, size) - 1) + 1 or size
+                quoted = quote is not None and _csv._ends_quoted(buf, delimiter, quote, False, start, end, first)
+                while quoted and end < size:
+                    stop = buf.find(b"\n", end) + 1 or size
+                    quoted = _csv._ends_quoted(buf, delimiter, quote, True, end, stop, first)
+                    end = stop
+                ranges.append((start, end, first_line))
+                first_line += buf[start:end].count(b"\n")
+                start = end
+        finally:
+            buf.close()
+    return ranges
+
+
+def _parse_csv_chunk(job):
+    """Parse a byte range of a CSV file into rows and the line number after each row"""
+
+    index, filename, start, end, encoding, force_type, delimiter, quotechar, strip = job
+    with open(filename, "rb") as filehandle:
+        filehandle.seek(start)
+        data = filehandle.read(end - start)
+    lines = io.StringIO(data.decode(encoding), newline=None)
+    if force_type == "unicodecsv" or strip:
+        reader = _csv.ScanningReader(lines, delimiter=delimiter, quotechar=quotechar)
+        if strip:
+            reader.set_strip()
+    else:
+        reader = csv.reader(lines, delimiter=delimiter, quotechar=quotechar)
+    rows = []
+    line_nums = []
+    for row in reader:
+        rows.append(row)
+        line_nums.append(reader.line_num)
+    return index, rows, line_nums
+
+
+class ParallelCSVReader(object):
+    """Mimic _csv.reader interface, parsing chunks of a CSV file in worker processes
+
+    The file is split into byte ranges on record boundaries. Rows are returned in file
+    order, or in the order chunks finish if ordered is False. The first chunk is always
+    returned first, so fieldnames are read from the start of the file. If strip is
+    true, the workers strip whitespace off all fields. Twice as many chunks as there
+    are workers are parsed or waiting to be passed on at a time.
+    """
+
+    chunk_size = 32 * 1024 * 1024
+
+    def __init__(self, filename, workers=None, ordered=True, force_type="csv", delimiter=";", quotechar='"', strip=False,
+                 encoding=None):
+        self.line_num = 0
+        self.filename = filename
+        self._workers_strip = bool(strip)
+        self._stripping = False  # whether rows get stripped in this process, at _strip_indices or all fields if None
+        self._strip_indices = None
+        encoding = encoding or locale.getpreferredencoding(False)
+        ranges = _csv_chunk_ranges(filename, self.chunk_size, delimiter, quotechar, encoding)
+        self._first_lines = [first_line for _, _, first_line in ranges]
+        self._chunk_sizes = [end - start for start, end, _ in ranges]
+        self.bytes_read = 0  # of the chunks passed on so far
+        jobs = iter([(index, filename, start, end, encoding, force_type, delimiter, quotechar, self._workers_strip)
+                     for index, (start, end, _) in enumerate(ranges)])
+        self._pool = multiprocessing.Pool(workers)
+        window = 2 * (workers or multiprocessing.cpu_count())  # chunks parsed or waiting to be passed on at a time
+        pending = [self._pool.apply_async(_parse_csv_chunk, (job,)) for job in islice(jobs, window)]
+        self._rows = self._iter_rows(self._results(pending, jobs, ordered))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def next(self):
+        return six_next(self._rows)
+
+    def set_strip(self, indices=None):
+        """Strip whitespace off the fields at indices, or off all fields if None
+
+        Chunks are already being parsed, so unless the workers strip all fields anyway, rows are stripped as they are passed on.
+        """
+
+        self._stripping = indices is not None or not self._workers_strip
+        self._strip_indices = None if indices is None else sorted(indices)
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
+
+    def _results(self, pending, jobs, ordered):
+        """Results of the pending chunks in file order, or the first one and then in the order they finish if not ordered
+
+        A further job is handed to the pool for each result taken, so parsed rows do not pile up in memory
+        if they are consumed slower than the workers parse them.
+        """
+
+        first = True
+        while pending:
+            if ordered or first:
+                result = pending.pop(0)
+                first = False
+            else:
+                result = self._next_ready(pending)
+            for job in islice(jobs, 1):
+                pending.append(self._pool.apply_async(_parse_csv_chunk, (job,)))
+            yield result.get()
+
+    @staticmethod
+    def _next_ready(pending, interval=0.01):
+        """Remove and return the first finished of the pending results, waiting for one if none is"""
+
+        while True:
+            for position, result in enumerate(pending):
+                if result.ready():
+                    return pending.pop(position)
+            pending[0].wait(interval)
+
+    def _iter_rows(self, results):
+        try:
+            for index, rows, line_nums in results:
+                self.bytes_read += self._chunk_sizes[index]
+                first_line = self._first_lines[index]
+                for row, line_num in zip(rows, line_nums):
+                    self.line_num = first_line + line_num
+                    if self._stripping:
+                        row = _strip_row(row, self._strip_indices)
+                    yield row
+        finally:
+            self.close()
+
+
+def _read_position(filehandle, parallel, file_size):
+    """Function returning the bytes of a file read so far, for ReaderStats
+
+    That is the position of the binary file handle CSV is read through, or the size of the chunks passed on by
+    parallel. Workbooks are loaded from the whole file on opening.
+    """
+
+    if parallel is not None:
+        return lambda: parallel.bytes_read
+    if filehandle is not None:
+        return getattr(filehandle, "buffer", filehandle).tell  # binary file below a text wrapper
+    return lambda: file_size
+
+
+def _strips_all(strip_whitespaces):
+    """Whether strip_whitespaces asks for all columns to be stripped instead of a list of column names"""
+
+    return bool(strip_whitespaces) and not isinstance(strip_whitespaces, (list, tuple, set, frozenset))
 
 
 class TableReader(object):
     """Consolidated interface for reading csv, xls and xlsx"""
 
-    def __init__(self, filename, sheet=None, fieldnames=None, strip_whitespaces=False, force_type=None, delimiter=";", quotechar='"'):
+    def __init__(self, filename, sheet=None, fieldnames=None, strip_whitespaces=False, force_type=None, delimiter=";", quotechar='"',
+                 workers=None, ordered=True, use_mmap=False, typed=False, schema=None, cache=None, row_type="dict", columns=None,
+                 skip_rows=0, max_rows=None, where=None, resumable=False, checkpoint=None,
+                 stats=False, on_stats=None, encoding=None):
         """Optional parameter description:
 
         :sheet: Sheet to use if document has sheet support, otherwise defaults to first one
         :fieldnames: If the table has no columns, column names in fixed order may be given here. Falls back to first row otherwise
-        :strip_whitespaces: before a column is passed on, a strip() on the string is be performed
-        :force_type: Enforce a certain file format, if filename's extension is not matching. Options are "CSV", "XLS" and "XLSX"
-        :delimiter: Delimiter used on CSV reading
+        :strip_whitespaces: before a column is passed on, a strip() on the string is be performed. True strips all columns
+                            including the header, a list of column names only those columns. Done while converting cells
+        :force_type: Enforce a certain file format instead of detecting it from the file's content and extension. Options are "CSV",
+                     "unicodecsv", "XLS", "XLSX" and "XLSX-fast", the latter reading xlsx through a streaming parser instead of openpyxl
+        :delimiter: Delimiter used on CSV reading, None guesses it from the start of the file
+        :quotechar: Quote character used on CSV reading, None guesses it from the start of the file
+        :workers: Parse CSV files in chunks on this many worker processes
+        :ordered: If False, rows of parallel parsed CSV chunks are returned in the order the chunks finish
+        :use_mmap: Read CSV files through a memory map, window by window, instead of a file handle
+        :typed: Return native int, float, datetime and bool values from xls and xlsx instead of strings, empty cells become None
+        :schema: Dict of column name to converter callable like int, float or decimal_comma, applied to non-empty values
+        :cache: SheetCache or directory name to keep parsed xls and xlsx rows in, so later opens skip the spreadsheet parser
+        :row_type: "dict" for DictReader rows or "tuple" for compact Row tuples, sharing one fieldname map across all rows
+        :columns: Names of the columns to return, in this order. Backends skip all other columns as early as they can
+        :skip_rows: Number of rows after the header to skip, spreadsheet rows are skipped by index and CSV lines without splitting them
+        :max_rows: Stop after this many rows following the skipped ones, without reading the rest of the file
+        :where: Callable receiving each row within skip_rows and max_rows, only rows it returns a true value for are passed on
+        :resumable: Read CSV through a byte offset tracking line source, so checkpoint() can tell where to continue later on.
+                    A last record without line break is held back, as it may still be written to
+        :checkpoint: Continue at a checkpoint() of an earlier reader of the same, meanwhile appended to, CSV file
+        :stats: Collect per-stage timings, row and cell counts, the file size and the bytes read in a ReaderStats instance,
+                available as reader.stats
+        :on_stats: Callable receiving the ReaderStats every ReaderStats.interval rows and at the end, implies stats
+        :encoding: Encoding of CSV files, defaults to the locale's preferred one. "auto" detects a UTF-8, UTF-16 or UTF-32 BOM,
+                   otherwise checks whether the start of the file is UTF-8 and falls back to cp1252
 
         """
 
@@ -186,36 +1060,239 @@ class TableReader(object):
             force_type = force_type.lower().strip()
 
         self.strip_whitespaces = strip_whitespaces
-        self.manually_strip_whitespaces = strip_whitespaces
+        self.typed = typed
+        self.schema = schema
+        self.where = where
+        if row_type == "tuple":
+            self._row_class = Row  # replaced by a row_class() for the fieldnames on the first row
+        elif row_type == "dict":
+            self._row_class = None
+        else:
+            raise ValueError("Unknown row type %s" % row_type)
+        self.stats = ReaderStats() if stats or on_stats is not None else None
+        opened = stats_clock()
+        self.filehandle = None
+        self.encoding = None
+        self._lines = None
+        self._line_base = 0
+        self._filename = filename
+        self._header_records = 0 if fieldnames else 1  # records before the first row, None if unknown
+        self._row_range = bool(skip_rows) or max_rows is not None
+        self._stripping = False
+        self._strip_indices = None
+        self._column_indices = None
+        self._on_stats = on_stats
+        self._row_index = None
+        self._parallel = None
+        if checkpoint is not None:
+            resumable = True
+            fieldnames = checkpoint["fieldnames"]
+            self._line_base = checkpoint["line_num"]
         self.is_stringio = "StringI" in filename.__class__.__name__
         if self.is_stringio and force_type is None:
                 raise ValueError("StringIO given but no forced type, I cannot guess!")
         if self.is_stringio:
             self.filehandle = filename
+            kind = force_type
+        else:
+            # Only peek at the content if needed, the file handle is kept for reading CSV as text later on
+            rawhandle = None
+            kind = force_type
+            if kind is None:
+                rawhandle = open(filename, "rb")
+                kind = _detect_type(filename, rawhandle)
+            if kind in ("csv", "unicodecsv"):
+                if encoding == "auto":
+                    rawhandle = rawhandle or open(filename, "rb")
+                    encoding = _detect_encoding(rawhandle)
+                self.encoding = encoding or locale.getpreferredencoding(False)
+            if resumable:
+                if kind not in ("csv", "unicodecsv") or workers or use_mmap:
+                    raise ValueError("Only CSV files read through a file handle are resumable")
+                self.filehandle = rawhandle or open(filename, "rb")
+                rawhandle = None
+            elif kind in ("csv", "unicodecsv") and use_mmap and not workers:
+                self.filehandle = rawhandle or open(filename, "rb")  # mapped window by window, see _mapped_lines
+                self.filehandle.seek(0)
+                rawhandle = None
+            elif kind in ("csv", "unicodecsv") and not workers:
+                if PY2:
+                    self.filehandle = open(filename)
+                else:
+                    # unicodecsv decodes large chunks of the binary file itself, csv reads through a text wrapper
+                    self.filehandle = rawhandle or open(filename, "rb")
+                    self.filehandle.seek(0)
+                    rawhandle = None
+                    if kind == "csv":
+                        self.filehandle = io.TextIOWrapper(self.filehandle, encoding=self.encoding)
+            if rawhandle is not None:
+                rawhandle.close()
+        if kind in ("csv", "unicodecsv") and (delimiter is None or quotechar is None):
+            delimiter, quotechar = self._sniff_dialect(filename, delimiter, quotechar)
+        self._kind = kind
+        self._dialect = (delimiter, quotechar)
+        self._mapped = bool(use_mmap)
+        if resumable and not self.is_stringio:
+            self._lines = ResumableLines(self.filehandle, self.encoding, delimiter, quotechar,
+                                         checkpoint["offset"] if checkpoint is not None else 0)
+            source = self._lines
+        elif use_mmap and kind in ("csv", "unicodecsv") and not workers and not self.is_stringio:
+            source = _mapped_lines(self.filehandle, self.encoding)
+        elif kind == "unicodecsv" and self.filehandle is not None and not self.is_stringio and not PY2:
+            source = _decoded_lines(self.filehandle, self.encoding)
         else:
-            self.filehandle = open(filename)
-        self.reader = csv.DictReader(self.filehandle, delimiter=delimiter, quotechar=quotechar, fieldnames=fieldnames)
-        if force_type == "csv" or (force_type is None and filename.endswith(".csv")):
-            # if it is plain csv, no action to take for us
-            if strip_whitespaces:
-                self.reader.reader = CSVStrippingReader(self.reader.reader)
-                self.manually_strip_whitespaces = False
-        elif force_type == "unicodecsv":
-            self.reader.reader = _csv.reader(self.filehandle, delimiter=delimiter, quotechar=quotechar)
-            if strip_whitespaces:
-                self.reader.reader = CSVStrippingReader(self.reader.reader)
-                self.manually_strip_whitespaces = False
-        elif force_type == "xls" or (force_type is None and filename.endswith(".xls")):
+            source = self.filehandle if self.filehandle is not None else []
+        self.reader = csv.DictReader(source, delimiter=delimiter, quotechar=quotechar, fieldnames=fieldnames)
+        if workers and kind in ("csv", "unicodecsv"):
+            if self.is_stringio:
+                raise ValueError("Parallel reading needs a file name, not StringIO")
+            self._parallel = ParallelCSVReader(filename, workers, ordered, kind, delimiter, quotechar,
+                                               strip=_strips_all(strip_whitespaces), encoding=self.encoding)
+            self.reader.reader = self._parallel
+        elif use_mmap and kind in ("csv", "unicodecsv") and self.is_stringio:
+            raise ValueError("Memory mapped reading needs a file name, not StringIO")
+        elif kind == "csv":
+            # if it is plain csv, no action to take for us, unless fields are to be stripped while splitting them
+            # mapped lines are decoded, the C csv module of Python 2 only takes encoded ones
+            if strip_whitespaces or (use_mmap and PY2):
+                self.reader.reader = _csv.ScanningReader(source, delimiter=delimiter, quotechar=quotechar)
+        elif kind == "unicodecsv":
+            self.reader.reader = _csv.ScanningReader(source, delimiter=delimiter, quotechar=quotechar)
+        elif kind == "xls":
             # Monkey patch reader to use XLS mimic sheet reader instead
-            self.reader.reader = XLReader(filename, sheet)
-        elif force_type == "xlsx" or (force_type is None and (filename.endswith(".xlsx") or
-                                                              filename.endswith(".xlsm") or
-                                                              filename.endswith(".xltx") or
-                                                              filename.endswith(".xltm"))):
+            self.reader.reader = self._open_sheet_reader(XLReader, "xls", filename, sheet, typed, cache)
+        elif kind == "xlsx":
             # Monkey patch reader to use XLSX mimic sheet reader instead
-            self.reader.reader = XLSXReader(filename, sheet)
+            self.reader.reader = self._open_sheet_reader(XLSXReader, "xlsx", filename, sheet, typed, cache)
+        elif kind == "xlsx-fast":
+            self.reader.reader = self._open_sheet_reader(XLSXStreamReader, "xlsx", filename, sheet, typed, cache)
         else:
             raise NotImplementedError("Unsupported file extension and no known type given as parameter")
+        if strip_whitespaces:
+            self._strip_columns(strip_whitespaces)
+        if self.stats is not None:
+            self.stats.add("open", stats_clock() - opened)
+            if not self.is_stringio:
+                self.stats.file_size = os.path.getsize(filename)
+                self.stats.position = _read_position(self.filehandle, self._parallel, self.stats.file_size)
+            self._instrument_backend()
+            self.stats.timed("open", lambda: self.fieldnames)()  # reading the header belongs to opening
+
+        if skip_rows or max_rows is not None:
+            self._restrict_rows(skip_rows, max_rows)
+        if columns:
+            self._select_columns(columns)
+        if self.stats is not None:
+            self._instrument(on_stats)
+
+    def _instrument_backend(self):
+        """Time stringification and stripping within the backend and the readers wrapping it"""
+
+        stats = self.stats
+        reader = self.reader.reader
+        while reader is not None:
+            if isinstance(reader, BaseXLReader):
+                reader.stringified_column = stats.timed("stringify", reader.stringified_column)
+                reader.typed_column = stats.timed("stringify", reader.typed_column)
+                reader.strip_column = stats.timed("strip", reader.strip_column)
+            elif isinstance(reader, XLSXReader):
+                reader.stringify = stats.timed("stringify", reader.stringify)
+            elif isinstance(reader, XLSXStreamReader):
+                reader._parse_row = stats.timed("stringify", reader._parse_row)
+            elif isinstance(reader, StrippingReader):
+                reader.strip = stats.timed("strip", reader.strip)
+            reader = getattr(reader, "__dict__", {}).get("reader")
+
+    def _instrument(self, on_stats):
+        """Time row fetches and row building, wrapping the functions doing the work"""
+
+        stats = self.stats
+        self.reader.reader = StatsReader(self.reader.reader, stats, on_stats)
+        self.next = stats.timed("dict", self.next)
+
+    def _sniff_dialect(self, filename, delimiter, quotechar):
+        """Fill in delimiter and quotechar left as None from a sample of the file, defaults are used if sniffing fails"""
+
+        if self.filehandle is not None:
+            sample = self.filehandle.read(SNIFF_SIZE)
+            self.filehandle.seek(0)
+            cut = len(sample) == SNIFF_SIZE
+            if isinstance(sample, bytes) and not isinstance(sample, str):  # binary handle of a resumable or unicodecsv reader
+                sample = codecs.getincrementaldecoder(self.encoding)("replace").decode(sample)
+        else:
+            with io.open(filename, encoding=self.encoding, errors="replace") as filehandle:
+                sample = filehandle.read(SNIFF_SIZE)
+            cut = len(sample) == SNIFF_SIZE
+        if cut:
+            sample = sample[:sample.rfind("\n") + 1] or sample  # do not look at a cut off line
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=SNIFF_DELIMITERS)
+        except csv.Error:
+            dialect = None
+        if delimiter is None:
+            delimiter = dialect.delimiter if dialect is not None else ";"
+        if quotechar is None:
+            quotechar = dialect.quotechar if dialect is not None else '"'
+        return str(delimiter), str(quotechar)
+
+    def _restrict_rows(self, skip, count):
+        """Limit rows to a range following the header, pushed down into the backend if it supports it"""
+
+        self.fieldnames  # the header row is never part of the range
+        if hasattr(self.reader.reader, "restrict"):
+            self.reader.reader.restrict(skip, count)
+        else:
+            self.reader.reader = RowRangeReader(self.reader.reader, skip, count)
+
+    def _strip_columns(self, strip_whitespaces):
+        """Have the backend strip whitespace while converting cells, of all columns or of those named in strip_whitespaces"""
+
+        if _strips_all(strip_whitespaces):
+            indices = None
+        else:
+            fieldnames = self.fieldnames or []
+            missing = [name for name in strip_whitespaces if name not in fieldnames]
+            if missing:
+                raise ValueError("No such column %s" % ", ".join(str(name) for name in missing))
+            indices = [index for index, name in enumerate(fieldnames) if name in strip_whitespaces]
+        self._stripping = True
+        self._strip_indices = indices
+        if hasattr(self.reader.reader, "set_strip"):
+            self.reader.reader.set_strip(indices)
+        else:
+            self.reader.reader = StrippingReader(self.reader.reader, indices)
+
+    def _select_columns(self, columns):
+        """Restrict rows to columns, pushing the selection down into the backend if it supports it"""
+
+        fieldnames = self.fieldnames or []
+        positions = dict((name, index) for index, name in reversed(list(enumerate(fieldnames))))
+        missing = [name for name in columns if name not in positions]
+        if missing:
+            raise ValueError("No such column %s" % ", ".join(str(name) for name in missing))
+        if len(set(columns)) != len(columns):
+            raise ValueError("Columns must not be given twice")
+        indices = [positions[name] for name in columns]
+        self._source_fieldnames = list(fieldnames)
+        self._column_indices = indices
+        if hasattr(self.reader.reader, "select_columns"):
+            self.reader.reader.select_columns(indices)
+        else:
+            self.reader.reader = ProjectingReader(self.reader.reader, indices)
+        self.reader.fieldnames = list(columns)
+
+    def _open_sheet_reader(self, reader_class, kind, filename, sheet, typed, cache):
+        """Open the sheet reader, or its rows from the cache if one is given"""
+
+        if cache is None or self.is_stringio:
+            return reader_class(filename, sheet, typed=typed)
+        if not isinstance(cache, SheetCache):
+            cache = SheetCache(cache)
+        key = cache.key(filename, kind, sheet, typed)
+        reader = cache.reader(key)
+        if reader is None:
+            reader = cache.recorder(key, reader_class(filename, sheet, typed=typed))
+        return reader
 
     def __iter__(self):
         return self
@@ -224,63 +1301,399 @@ class TableReader(object):
         return self.next()
 
     def __del__(self):
-        if not self.is_stringio:
+        if getattr(self, "filehandle", None) is not None and not self.is_stringio:
             self.filehandle.close()
+        if getattr(self, "reader", None) is not None:
+            self._close_backend()  # e.g. hands a shared workbook back if iteration stopped early
 
     def next(self):
-        # Strip whitespace here if the reader was not able to do it by itself already (only CSV is capable of doing it currently)
-        if self.manually_strip_whitespaces:
-            newrow = {}
-            for k, v in six_next(self.reader).iteritems():
-                if isinstance(v, six_string_types):
-                    newrow[k] = v.strip()
-                else:
-                    newrow[k] = v
-            return newrow
+        if self._row_class is not None:
+            return self._next_compact()
+        while True:
+            newrow = six_next(self.reader)
+            if self.schema:
+                for name, convert in self.schema.items():
+                    if name in newrow:
+                        value = newrow[name]
+                        newrow[name] = None if value is None or value == CLEAR_STRING else convert(value)
+            if self.where is None or self.where(newrow):
+                return newrow
+
+    def _next_compact(self):
+        """Build a row_class instance straight from the underlying reader's row"""
+
+        if self._row_class is Row:
+            fieldnames = self.fieldnames
+            if fieldnames is None:
+                raise StopIteration
+            self._row_class = row_class(fieldnames)
+            self._schema_indices = [(self._row_class._index[name], convert) for name, convert in (self.schema or {}).items()
+                                    if name in self._row_class._index]
+        reader = self.reader.reader
+        width = len(self._row_class._fields)
+        while True:
+            row = six_next(reader)
+            while not row:
+                row = six_next(reader)
+            self.reader.line_num = reader.line_num
+            if len(row) != width:
+                row = (list(row) + [None] * width)[:width]
+            if self._schema_indices:
+                row = list(row)
+                for index, convert in self._schema_indices:
+                    value = row[index]
+                    row[index] = None if value is None or value == CLEAR_STRING else convert(value)
+            row = self._row_class(row)
+            if self.where is None or self.where(row):
+                return row
+
+    def iter_batches(self, batch_size=1000):
+        """Yield column-oriented batches of up to batch_size rows
+
+        Each batch maps every fieldname to a list of values. Rows are taken straight
+        from the underlying reader, so no dict is built per row. Like DictReader,
+        empty rows are skipped and short rows are padded with None, surplus values
+        of long rows are dropped. Batches may be smaller if where is given.
+        """
+
+        fieldnames = self.fieldnames
+        if not fieldnames:
+            return
+        reader = self.reader.reader
+        width = len(fieldnames)
+        padding = [None] * width
+        while True:
+            rows = []
+            for row in reader:
+                if not row:
+                    continue
+                if len(row) != width:
+                    row = (list(row) + padding)[:width]
+                rows.append(row)
+                if len(rows) == batch_size:
+                    break
+            self.reader.line_num = reader.line_num
+            if not rows:
+                return
+            columns = [list(column) for column in zip(*rows)]
+            batch = dict(zip(fieldnames, columns))
+            if self.schema:
+                for name, convert in self.schema.items():
+                    if name in batch:
+                        batch[name] = [None if value is None or value == CLEAR_STRING else convert(value)
+                                       for value in batch[name]]
+            if self.where is not None:
+                columns = [batch[name] for name in fieldnames]
+                keep = [self.where(dict(zip(fieldnames, values))) for values in zip(*columns)]
+                batch = dict((name, [value for value, kept in zip(column, keep) if kept])
+                             for name, column in zip(fieldnames, columns))
+            if any(batch.values()):
+                yield batch
+            if len(rows) < batch_size:
+                return
+
+    def build_index(self, every=1, path=None):
+        """Index the byte offset of every nth row of a CSV file, so seek_row() and reader[row] jump straight to rows
+
+        The index is stored in a sidecar file at path, defaulting to the file name plus ".rowidx", and reused as long as
+        size and mtime of the file match. Returns the number of rows, counted like iterating the reader counts them.
+        """
+
+        self._check_random_access()
+        delimiter, quotechar = self._dialect
+        byte_encoding = _byte_encoding(self.encoding)
+        quote = quotechar.encode(byte_encoding) if quotechar else None
+        delimiter = delimiter.encode(byte_encoding)
+        path = path or self._filename + INDEX_SUFFIX
+        index = RowIndex.load(path, RowIndex.fingerprint(self._filename, quote, delimiter, every, self._header_records))
+        if index is None:
+            index = RowIndex.build(self._filename, quote, delimiter, every, self._header_records,
+                                   skip_bom=codecs.lookup(self.encoding).name == "utf-8-sig")
+            try:
+                index.save(path)
+            except (IOError, OSError):
+                pass  # e.g. a read-only directory, the index is kept in memory only
+        self._row_index = index
+        return index.rows
+
+    def seek_row(self, row):
+        """Continue reading at row, the first one after the header being 0. Negative rows count from the end
+
+        Builds an index with the defaults of build_index() if there is none yet.
+        """
+
+        if self._row_index is None:
+            self.build_index()
+        index = self._row_index
+        if row < 0:
+            row += index.rows
+        if not 0 <= row < index.rows:
+            raise IndexError("Row %d out of range" % row)
+        offset, lines, passed = index.locate(row)
+        self.fieldnames  # read the header before the source moves
+        filehandle = getattr(self.filehandle, "buffer", self.filehandle)  # binary file below a text wrapper
+        filehandle.seek(offset)
+        delimiter, quotechar = self._dialect
+        source = _decoded_lines(filehandle, self.encoding)
+        if self._kind == "csv" and not self._stripping:
+            # the parser chosen on opening, the C csv reader is more lenient with malformed records
+            backend = csv.reader(source, delimiter=delimiter, quotechar=quotechar)
+            if self._column_indices is not None:
+                backend = ProjectingReader(backend, self._column_indices)
         else:
-            return six_next(self.reader)
+            backend = _csv.ScanningReader(source, delimiter=delimiter, quotechar=quotechar)
+            if self._stripping:
+                backend.set_strip(self._strip_indices)
+            if self._column_indices is not None:
+                backend.select_columns(self._column_indices)
+        while passed:
+            if six_next(backend):
+                passed -= 1
+        if self.stats is not None:
+            backend = StatsReader(backend, self.stats, self._on_stats)
+        self.reader.reader = backend
+        self.reader.line_num = backend.line_num
+        self._line_base = lines
+
+    def __getitem__(self, key):
+        """Row at an index or list of rows of a slice, see seek_row(). Reading continues behind the rows returned"""
+
+        if not isinstance(key, slice):
+            self.seek_row(key)
+            return six_next(self)
+        if self._row_index is None:
+            self.build_index()
+        start, stop, step = key.indices(self._row_index.rows)
+        if step < 0:
+            raise ValueError("Slices of rows need a positive step")
+        if start >= stop:
+            return []
+        self.seek_row(start)
+        return list(islice(self, 0, stop - start, step))
+
+    def _check_random_access(self):
+        if (self.filehandle is None or self._lines is not None or self._mapped or self.is_stringio or PY2
+                or self._header_records is None):
+            raise ValueError("Random row access needs a CSV file read through a file handle")
+        if self._row_range or self.where is not None:
+            raise ValueError("Random row access does not combine with skip_rows, max_rows or where")
+
+    def to_columns(self, dtypes=None, sample_size=1000):
+        """Read the remaining rows into an OrderedDict of fieldname to NumPy array, needs NumPy
+
+        :dtypes: Dict of column name to NumPy dtype, other columns get one inferred from the first sample_size rows.
+                 Empty values make int columns float. If later rows do not fit an inferred dtype, the column is converted
+                 to float or object, if they do not fit a given one, ValueError is raised
+        :sample_size: Number of rows dtypes are inferred from and converted at once
+
+        xls values are read straight from the sheet's columns as native values, unless where or schema are given.
+        """
+
+        fieldnames = self.fieldnames
+        if not fieldnames:
+            return OrderedDict()
+        backend = self.reader.reader
+        if isinstance(backend, BaseXLReader) and self.where is None and not self.schema and backend.column_count == len(fieldnames):
+            blocks = backend.column_blocks(sample_size)
+        else:
+            blocks = ([batch[name] for name in fieldnames] for batch in self.iter_batches(sample_size))
+        columns = OrderedDict(build_columns(fieldnames, blocks, dtypes, sample_size))
+        self.reader.line_num = backend.line_num
+        return columns
+
+    def to_numpy(self, dtypes=None, sample_size=1000):
+        """Read the remaining rows into a NumPy structured array with a field per column, see to_columns()"""
+
+        return to_records(list(self.to_columns(dtypes, sample_size).items()))
 
     @property
     def line_num(self):
-        return self.reader.line_num
+        return self.reader.line_num + self._line_base
 
     @property
     def fieldnames(self):
         return self.reader.fieldnames
 
+    def checkpoint(self):
+        """Position behind the last row returned, as dict of byte offset, line_num and fieldnames
+
+        Pass it to TableReader.resume() later on to read only records appended meanwhile. Needs resumable=True.
+        """
+
+        if self._lines is None:
+            raise ValueError("Checkpoints need a reader opened with resumable=True")
+        fieldnames = self.fieldnames
+        return {
+            "offset": self._lines.offset,
+            "line_num": self.line_num,
+            "fieldnames": getattr(self, "_source_fieldnames", None) or (list(fieldnames) if fieldnames else None),
+        }
+
+    @staticmethod
+    def resume(filename, checkpoint, **kwargs):
+        """Open filename at a checkpoint() of an earlier reader, only records behind it are read
+
+        Further keyword arguments are passed to TableReader and should match those of the earlier reader.
+        """
+
+        return TableReader(filename, checkpoint=checkpoint, **kwargs)
+
     @staticmethod
     def get_sheet_names(filename):
-        if filename.endswith(".xls"):
-            reader = xlrd2.open_workbook(filename)
-            return reader.sheet_names()
-        elif (filename.endswith(".xlsx") or
-              filename.endswith(".xlsm") or
-              filename.endswith(".xltx") or
-              filename.endswith(".xltm")):
-            reader = openpyxl.load_workbook(filename, read_only=True)
-            return reader.get_sheet_names()
+        with open(filename, "rb") as filehandle:
+            kind = _detect_type(filename, filehandle)
+        if kind == "xls":
+            book = workbook_cache.acquire(filename, "xls", partial(_open_xls, filename), True)
+            try:
+                return book.sheet_names()
+            finally:
+                workbook_cache.release(book)
+        elif kind == "xlsx":
+            book = workbook_cache.acquire(filename, "xlsx", partial(_open_xlsx, filename))
+            try:
+                return list(book.sheetnames)
+            finally:
+                workbook_cache.release(book)
         else:
             raise NotImplementedError("Unsupported file format")
 
+    @staticmethod
+    def read_sheets(filename, sheets=None, workers=None, batch_size=None, **kwargs):
+        """Read several sheets of a workbook in parallel worker processes
+
+        :sheets: Names of the sheets to read, defaults to all sheets of the workbook
+        :workers: Number of worker processes, defaults to one per sheet up to the number of CPUs
+        :batch_size: If given, sheets are read through iter_batches() instead of row by row
+
+        Further keyword arguments are passed to TableReader. Returns an OrderedDict mapping
+        each sheet name to its list of rows or batches.
+        """
+
+        if sheets is None:
+            sheets = TableReader.get_sheet_names(filename)
+        if workers is None:
+            workers = min(len(sheets), multiprocessing.cpu_count())
+        jobs = [(filename, sheet, batch_size, kwargs) for sheet in sheets]
+        if workers > 1 and len(jobs) > 1:
+            pool = multiprocessing.Pool(workers)
+            try:
+                results = pool.map(_read_sheet, jobs, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [_read_sheet(job) for job in jobs]
+        return OrderedDict(zip(sheets, results))
+
     def close(self):
-        if not self.is_stringio:
+        if self.stats is not None:
+            self.stats.freeze()  # bytes_read can no longer be told once the file is closed
+        if self.filehandle is not None and not self.is_stringio:
             self.filehandle.close()
+        self._close_backend()
+
+    def _close_backend(self):
+        backend_close = getattr(self.reader.reader, "close", None)
+        if backend_close is not None:
+            backend_close()
+
+
+def _read_sheet(job):
+    """Read all rows of a sheet, module level so multiprocessing can pickle it"""
+
+    filename, sheet, batch_size, kwargs = job
+    reader = TableReader(filename, sheet=sheet, **kwargs)
+    try:
+        if batch_size:
+            return list(reader.iter_batches(batch_size))
+        return list(reader)
+    finally:
+        reader.close()
 
 
 class OffsetTableReader(TableReader):
     """Tablereader able to treat a row with a special value as header row. Just give search string as second parameter"""
 
-    def __init__(self, filename, header_start_content, sheet=None, fieldnames=[], strip_whitespaces=False, force_type=None):
-        super(OffsetTableReader, self).__init__(filename=filename, sheet=sheet, fieldnames=fieldnames, strip_whitespaces=strip_whitespaces, force_type=force_type)
+    def __init__(self, filename, header_start_content, sheet=None, fieldnames=[], strip_whitespaces=False, force_type=None, columns=None,
+                 skip_rows=0, max_rows=None, where=None, header_scan_rows=None, encoding=None, delimiter=";", quotechar='"'):
+        """Optional parameter description, see TableReader for the others:
+
+        :header_start_content: Cell content marking the header row. May also be a list of candidates or a compiled regular
+                               expression, which is searched for in every string cell
+        :header_scan_rows: Give up with a ValueError if the header is not within this many rows, instead of reading the whole file
+
+        The number of rows before the header is remembered per file fingerprint, so opening the same file again jumps right to it.
+        """
 
-        def iter_columns():
-            for row in self.reader.reader:
-                for columnno in range(len(row)):
-                    yield row, columnno
+        # all columns are stripped before searching the header, named ones only once the header is known
+        super(OffsetTableReader, self).__init__(filename=filename, sheet=sheet, fieldnames=fieldnames,
+                                                strip_whitespaces=_strips_all(strip_whitespaces), force_type=force_type, where=where,
+                                                encoding=encoding, delimiter=delimiter, quotechar=quotechar)
 
         if not fieldnames:
-            for row, columnno in iter_columns():
-                check_column = row[columnno]
-                if check_column == header_start_content:
-                    self.reader.fieldnames = [columnname for columnname in row]
+            self.reader.fieldnames = self._find_header(filename, header_start_content, sheet, force_type, header_scan_rows)
+            self._header_records = None
+        if strip_whitespaces and not _strips_all(strip_whitespaces):
+            self.strip_whitespaces = strip_whitespaces
+            self._strip_columns(strip_whitespaces)
+
+        if skip_rows or max_rows is not None:
+            self._restrict_rows(skip_rows, max_rows)
+        if columns:
+            self._select_columns(columns)
+
+    def _find_header(self, filename, header_start_content, sheet, force_type, header_scan_rows):
+        """Return the header row, leaving the reader right behind it"""
+
+        matches = _header_matcher(header_start_content)
+        reader = self.reader.reader
+        key = None
+        passed = 0
+        if not self.is_stringio:
+            stat = os.stat(filename)
+            key = (os.path.abspath(filename), stat.st_size, stat.st_mtime, sheet, force_type, repr(header_start_content))
+            offset = _header_offsets.get(key)
+            if offset is not None and (header_scan_rows is None or offset < header_scan_rows):
+                try:
+                    _skip_rows(reader, offset)
+                    row = six_next(reader)
+                except StopIteration:
+                    row = []
+                passed = offset + 1
+                if any(map(matches, row)):
+                    return list(row)
+
+        if passed == 0 and hasattr(reader, "find_header"):
+            offset = reader.find_header(matches, header_scan_rows)
+            row = six_next(reader) if offset is not None else None
+        else:
+            row = None
+            offset = passed
+            while header_scan_rows is None or offset < header_scan_rows:
+                try:
+                    row = six_next(reader)
+                except StopIteration:
+                    row = None
+                    break
+                if any(map(matches, row)):
                     break
+                offset += 1
+                row = None
+        if row is None:
+            raise ValueError("No header row with %r found" % (header_start_content,))
+        if key is not None:
+            if len(_header_offsets) >= HEADER_OFFSETS_SIZE:
+                _header_offsets.clear()
+            _header_offsets[key] = offset
+        return list(row)
+
+
+def _header_matcher(header_start_content):
+    """Predicate telling whether a cell marks the header row"""
+
+    if hasattr(header_start_content, "search"):
+        return lambda value: isinstance(value, six_string_types) and header_start_content.search(value) is not None
+    elif isinstance(header_start_content, six_string_types):
+        return partial(operator.eq, header_start_content)
+    candidates = frozenset(header_start_content)
+    return lambda value: value in candidates
@@ -0,0 +1,36 @@
+"""
+    tablereader.__main__
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Command line entry point, python -m tablereader <command> [options]
+
+    :license: BSD-3
+"""
+
+#
+# Python imports
+import argparse
+import sys
+
+#
+# local imports
+from tablereader import bench, convert
+
+#
+# constants
+COMMANDS = {
+    "bench": bench.main,
+    "convert": convert.main,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tablereader")
+    parser.add_argument("command", choices=sorted(COMMANDS), help="run python -m tablereader <command> --help for its options")
+    parser.add_argument("arguments", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    return COMMANDS[args.command](args.arguments)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
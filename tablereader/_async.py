@@ -0,0 +1,180 @@
+"""
+    tablereader._async
+    ~~~~~~~~~~~~~~~~~~
+
+    TableReader for asyncio applications
+
+    Rows are parsed by a regular TableReader on an executor thread, chunk by chunk,
+    while the event loop keeps running. At most prefetch chunks are buffered ahead
+    of the consumer, so a slow consumer holds the parser back. Python 3.5+ only.
+
+    :license: BSD-3
+"""
+
+#
+# Python imports
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+#
+# local imports
+import tablereader
+
+
+class AsyncTableReader(object):
+    """Asynchronous interface to TableReader
+
+    Use as "async with AsyncTableReader(filename) as reader" and iterate with "async for row in reader" or
+    "async for batch in reader.batches(1000)". Rows are the same as TableReader returns for the same arguments.
+    """
+
+    def __init__(self, filename, prefetch=4, chunk_size=256, executor=None, reader_class=None, **kwargs):
+        """Optional parameter description:
+
+        :prefetch: Number of chunks parsed ahead of the consumer
+        :chunk_size: Number of rows fetched per executor call
+        :executor: concurrent.futures.ThreadPoolExecutor running the parser, defaults to a thread of its own.
+                   Calls are issued one at a time. The reader itself stays in this process, so process executors
+                   raise ValueError
+        :reader_class: TableReader or a subclass like OffsetTableReader, created with filename and further keyword arguments
+
+        """
+
+        if executor is not None and not isinstance(executor, ThreadPoolExecutor):
+            raise ValueError("AsyncTableReader needs a ThreadPoolExecutor, the reader cannot be shared with other processes")
+        self.filename = filename
+        self.prefetch = prefetch
+        self.chunk_size = chunk_size
+        self.reader_class = reader_class or tablereader.TableReader
+        self.kwargs = kwargs
+        self.reader = None
+        self._own_executor = executor is None
+        self._executor = executor
+        self._queue = None
+        self._producer = None
+        self._fetching = None  # executor call in flight, waited for on close
+        self._chunk = []
+        self._position = 0
+
+    @property
+    def line_num(self):
+        """Line number of the parser, which runs ahead of the consumer by up to prefetch chunks"""
+
+        return self.reader.line_num if self.reader is not None else 0
+
+    @property
+    def fieldnames(self):
+        return self.reader.fieldnames if self.reader is not None else None
+
+    async def _run(self, function, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, function, *args)
+
+    async def open(self):
+        """Open the file and read its header on the executor"""
+
+        if self.reader is None:
+            self.reader = await self._run(lambda: self.reader_class(self.filename, **self.kwargs))
+            await self._run(lambda: self.reader.fieldnames)
+        return self
+
+    async def aclose(self):
+        """Stop parsing ahead and close the reader"""
+
+        if self._producer is not None:
+            self._producer.cancel()
+            self._producer = None
+        if self._fetching is not None:
+            await asyncio.wait([self._fetching])
+            if not self._fetching.cancelled():
+                self._fetching.exception()  # consumer is gone, nobody else will look at it
+            self._fetching = None
+        if self.reader is not None:
+            await self._run(self.reader.close)
+            self.reader = None
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while self._position >= len(self._chunk):
+            if self._queue is None:
+                await self.open()
+                self._start(self._fetch_rows)
+            self._chunk = await self._next_chunk()
+            self._position = 0
+        row = self._chunk[self._position]
+        self._position += 1
+        return row
+
+    def batches(self, batch_size=1000):
+        """Asynchronous iterator over TableReader.iter_batches(batch_size)"""
+
+        return _AsyncBatches(self, batch_size)
+
+    def _fetch_rows(self):
+        return list(islice(self.reader, self.chunk_size))
+
+    def _start(self, fetch):
+        if self._queue is not None:
+            raise RuntimeError("Reader is already being iterated")
+        self._queue = asyncio.Queue(maxsize=self.prefetch)
+        self._producer = asyncio.ensure_future(self._produce(fetch))
+
+    async def _produce(self, fetch):
+        """Parse chunks one after another into the queue, an empty chunk marks the end"""
+
+        chunk = True
+        while chunk:
+            self._fetching = asyncio.ensure_future(self._run(fetch))
+            try:
+                chunk = await asyncio.shield(self._fetching)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                await self._queue.put(error)
+                return
+            self._fetching = None
+            await self._queue.put(chunk)
+
+    async def _next_chunk(self):
+        chunk = await self._queue.get()
+        if isinstance(chunk, Exception):
+            self._queue.put_nowait(chunk)  # raise again on later calls
+            raise chunk
+        if not chunk:
+            self._queue.put_nowait(chunk)
+            raise StopAsyncIteration
+        return chunk
+
+
+class _AsyncBatches(object):
+    """Asynchronous iterator over the column-oriented batches of an AsyncTableReader"""
+
+    def __init__(self, reader, batch_size):
+        self.reader = reader
+        self.batch_size = batch_size
+        self._batches = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        reader = self.reader
+        if self._batches is None:
+            await reader.open()
+            self._batches = reader.reader.iter_batches(self.batch_size)
+            reader._start(lambda: list(islice(self._batches, 1)))
+        return (await reader._next_chunk())[0]
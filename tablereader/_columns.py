@@ -0,0 +1,219 @@
+"""
+    tablereader._columns
+    ~~~~~~~~~~~~~~~~~~~~
+
+    NumPy arrays per column, only available if NumPy is installed
+
+    Column dtypes are inferred from the first block of rows, later blocks are
+    converted block-wise into preallocated arrays which grow geometrically. A
+    block not fitting an inferred dtype upcasts the column, int to float and
+    everything else to object. Object columns hold the values as they were
+    passed in, also those converted before the upcast.
+
+    :license: BSD-3
+"""
+
+#
+# Python imports
+from datetime import datetime
+
+#
+# environment imports
+from six import string_types as six_string_types, text_type as six_text_type
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#
+# constants
+CLEAR_STRING = ""
+UPCASTS = {"b": "O", "i": "f8", "f": "O", "M": "O"}  # dtype kind to the dtype taking over if a block does not fit
+MISSING = {"f": float("nan"), "M": "NaT"}  # dtype kind to the value empty cells become, other kinds cannot hold them
+
+
+def _parse_text(text):
+    """int or float in text, None if it is no number or has leading zeros like an article number"""
+
+    text = text.strip()
+    digits = text.lstrip("+-")
+    if len(digits) > 1 and digits[0] == "0" and digits[1].isdigit():
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def infer_dtype(values):
+    """dtype fitting the non-empty values, int columns with empty values become float"""
+
+    present = [value for value in values if value is not None and value != CLEAR_STRING]
+    if not present:
+        return numpy.dtype("O")
+    complete = len(present) == len(values)
+    if all(isinstance(value, bool) for value in present):
+        return numpy.dtype("?" if complete else "O")
+    if all(isinstance(value, datetime) for value in present):
+        return numpy.dtype("M8[us]")
+    integral = True
+    for value in present:
+        if isinstance(value, six_string_types):
+            value = _parse_text(value)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return numpy.dtype("O")
+        if isinstance(value, float) and not value.is_integer():
+            integral = False
+    return numpy.dtype("i8" if integral and complete else "f8")
+
+
+def to_array(values, dtype):
+    """Convert a list of values to an array of dtype, raises ValueError or TypeError if they do not fit"""
+
+    kind = dtype.kind
+    if kind == "O":
+        result = numpy.empty(len(values), dtype)
+        result[:] = values
+        return result
+    if None in values or CLEAR_STRING in values:
+        if kind not in MISSING:
+            raise ValueError("Empty values do not fit %s" % dtype)
+        missing = MISSING[kind]
+        values = [missing if value is None or value == CLEAR_STRING else value for value in values]
+    if kind == "b":
+        if not all(isinstance(value, bool) for value in values):
+            raise ValueError("Values do not fit %s" % dtype)
+        return numpy.array(values, dtype)
+    elif kind == "M":
+        return numpy.array(values, dtype)
+    result = numpy.array(values)
+    if result.dtype.kind in "USO":
+        result = result.astype("f8")  # numeric text, anything else raises
+    if kind == "i" and result.dtype.kind == "f" and not numpy.array_equal(result, numpy.trunc(result)):
+        raise ValueError("Values do not fit %s" % dtype)
+    return result.astype(dtype)
+
+
+def _restored(item, kind, text):
+    """Value an array item of kind was converted from, if it was text or a native value as given"""
+
+    if kind == "i":
+        item = int(item)  # also for items of int blocks upcast to float
+    if text:
+        return six_text_type(item if kind == "i" else repr(item))
+    return item
+
+
+class ColumnBuilder(object):
+    """Collect blocks of a column's values into one array
+
+    The dtype is inferred from the first block unless given. Inferred dtypes are upcast if
+    a later block does not fit, given ones raise ValueError. Values the array does not
+    restore as they were passed in, like "3.50" or empty ones, are kept aside until the
+    column turns out not to be upcast to object.
+    """
+
+    def __init__(self, name, dtype=None, capacity=1024):
+        self.name = name
+        self.dtype = numpy.dtype(dtype) if dtype is not None else None
+        self.explicit = dtype is not None
+        self.length = 0
+        self._capacity = capacity
+        self._array = None
+        self._segments = []  # (start, kind, text) of the runs of values appended before an upcast to object
+        self._originals = {}  # position to value passed in, where _restored() does not return it
+
+    def append(self, values):
+        if self.dtype is None:
+            self.dtype = infer_dtype(values)
+        while True:
+            try:
+                block = to_array(values, self.dtype)
+                break
+            except (ValueError, TypeError, OverflowError) as error:
+                if self.explicit:
+                    raise ValueError("Column %s does not fit %s: %s" % (self.name, self.dtype, error))
+                self._upcast(numpy.dtype(UPCASTS[self.dtype.kind]))
+        if not self.explicit and self.dtype.kind != "O":
+            self._keep_originals(values, block)
+        self._reserve(len(block))
+        self._array[self.length:self.length + len(block)] = block
+        self.length += len(block)
+
+    def result(self):
+        """The array of all values appended, trimmed to their number"""
+
+        if self._array is None:
+            return numpy.empty(0, self.dtype or numpy.dtype("O"))
+        self._array.resize(self.length, refcheck=False)
+        return self._array
+
+    def _reserve(self, count):
+        """Make room for count more values, at least doubling the capacity if it is exceeded"""
+
+        if self._array is None:
+            self._array = numpy.empty(max(self._capacity, count), self.dtype)
+        elif self.length + count > len(self._array):
+            array = numpy.empty(max(2 * len(self._array), self.length + count), self.dtype)
+            array[:self.length] = self._array[:self.length]
+            self._array = array
+
+    def _keep_originals(self, values, block):
+        """Note how to restore values from block, keeping those it does not restore as they are"""
+
+        kind = self.dtype.kind
+        text = any(isinstance(value, six_string_types) for value in values)
+        if not self._segments or self._segments[-1][1:] != (kind, text):
+            self._segments.append((self.length, kind, text))
+        originals = self._originals
+        for position, (value, item) in enumerate(zip(values, block.tolist()), self.length):
+            restored = _restored(item, kind, text)
+            if type(restored) is not type(value) or restored != value:
+                originals[position] = value
+
+    def _upcast(self, dtype):
+        self.dtype = dtype
+        if self._array is None:
+            return
+        if dtype.kind != "O":
+            self._array = self._array.astype(dtype)
+            return
+        items = self._array[:self.length].tolist()
+        array = numpy.empty(len(self._array), dtype)
+        ends = [start for start, _, _ in self._segments[1:]] + [self.length]
+        for (start, kind, text), end in zip(self._segments, ends):
+            array[start:end] = [_restored(item, kind, text) for item in items[start:end]]
+        for position, value in self._originals.items():
+            array[position] = value
+        self._array = array
+        self._segments = []
+        self._originals = {}
+
+
+def build_columns(fieldnames, blocks, dtypes=None, sample_size=1000):
+    """Arrays per fieldname from blocks, each a list of value lists in fieldnames order"""
+
+    if numpy is None:
+        raise ImportError("NumPy is needed for column arrays")
+    dtypes = dtypes or {}
+    builders = [ColumnBuilder(name, dtypes.get(name), sample_size) for name in fieldnames]
+    for columns in blocks:
+        for builder, values in zip(builders, columns):
+            builder.append(values)
+    return [(builder.name, builder.result()) for builder in builders]
+
+
+def to_records(columns):
+    """Structured array of (name, array) pairs of the same length"""
+
+    if numpy is None:
+        raise ImportError("NumPy is needed for column arrays")
+    length = len(columns[0][1]) if columns else 0
+    result = numpy.empty(length, [(str(name), array.dtype) for name, array in columns])
+    for name, array in columns:
+        result[str(name)] = array
+    return result
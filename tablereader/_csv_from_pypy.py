@@ -58,6 +58,8 @@ SETTINGS:
         written as two quotes.
 """
 
+import re
+
 __version__ = "1.0"
 
 QUOTE_MINIMAL, QUOTE_ALL, QUOTE_NONNUMERIC, QUOTE_NONE = range(4)
@@ -207,6 +209,8 @@ class Reader(object):
      IN_QUOTED_FIELD, ESCAPE_IN_QUOTED_FIELD, QUOTE_IN_QUOTED_FIELD,
      EAT_CRNL) = range(8)
 
+    _strip = None  # True or field indices to strip whitespace of when saved
+
     def __init__(self, iterator, dialect=None, **kwargs):
         self.dialect = _call_dialect(dialect, kwargs)
         self.input_iter = iter(iterator)
@@ -410,6 +414,8 @@ class Reader(object):
 
     def _parse_save_field(self):
         field, self.field = self.field, ''
+        if self._strip is not None and (self._strip is True or len(self.fields) in self._strip):
+            field = field.strip()
         if self.numeric_field:
             self.numeric_field = False
             field = float(field)
@@ -421,54 +427,293 @@ class Reader(object):
         self.field += c
 
 
+def _scan_record(body, delimiter, quotechar, doublequote):
+    """Split a complete one-line record using str.find only.
+
+    body must not contain line break characters. Returns None if the record
+    needs the state machine, e.g. because a quoted field spans several lines
+    or text follows a closing quote."""
+    fields = []
+    pos = 0
+    end = len(body)
+    while True:
+        if body.startswith(quotechar, pos):
+            parts = []
+            start = pos + 1
+            while True:
+                closing = body.find(quotechar, start)
+                if closing < 0:
+                    return None
+                parts.append(body[start:closing])
+                pos = closing + 1
+                if doublequote and body.startswith(quotechar, pos):
+                    parts.append(quotechar)
+                    start = pos + 1
+                    continue
+                break
+            fields.append(body[:0].join(parts))
+            if pos == end:
+                return fields
+            if not body.startswith(delimiter, pos):
+                return None
+            pos += 1
+        else:
+            found = body.find(delimiter, pos)
+            if found < 0:
+                fields.append(body[pos:])
+                return fields
+            fields.append(body[pos:found])
+            pos = found + 1
+
+
+def _split_line(body, delimiter, quotechar, doublequote, maxsplit=-1):
+    """Split a complete one-line record, works on str and bytes alike.
+
+    Plain str.split first, only fields starting with a quote need a closer
+    look. Returns None where _scan_record does. With maxsplit, the last field
+    holds the unsplit rest of the record and is not looked at, unless it holds
+    a quote character. A quoted field in there may not end on this line, so
+    the record is split completely then."""
+    fields = body.split(delimiter, maxsplit)
+    if not quotechar or quotechar not in body:
+        return fields
+    if 0 <= maxsplit < len(fields) and quotechar in fields[maxsplit]:
+        return _split_line(body, delimiter, quotechar, doublequote)
+    pair = quotechar * 2
+    for i, field in enumerate(fields):
+        if i == maxsplit:
+            break
+        if field.startswith(quotechar):
+            inner = field[1:-1]
+            if (len(field) < 2 or not field.endswith(quotechar)
+                    or (quotechar in inner
+                        and (not doublequote
+                             or quotechar in inner.replace(pair, body[:0])))):
+                return _scan_record(body, delimiter, quotechar, doublequote)
+            if quotechar in inner:
+                inner = inner.replace(pair, quotechar)
+            fields[i] = inner
+    return fields
+
+
+def _ends_quoted(text, delimiter, quotechar, quoted=False, start=0, end=None,
+                 first=0):
+    """Whether text[start:end] ends within a quoted field, works on str and
+    bytes alike.
+
+    quoted is the state at start. As in Reader, a quote character only opens
+    a quoted field at the start of a field, that is at first, right behind a
+    delimiter or behind a line break. Anywhere else it is a literal. Quotes
+    are escaped by doubling them."""
+    if end is None:
+        end = len(text)
+    breaks = ("\n", "\r") if isinstance(text, str) else (b"\n", b"\r")
+    pos = start
+    while True:
+        found = text.find(quotechar, pos, end)
+        if found < 0:
+            return quoted
+        pos = found + 1
+        if quoted:
+            if pos < end and text[pos:pos + 1] == quotechar:
+                pos += 1  # doubled quote
+            else:
+                quoted = False
+        elif found == first or text[found - 1:found] in (delimiter,) + breaks:
+            quoted = True
+
+
+class ScanningReader(Reader):
+    """CSV reader splitting whole lines instead of single characters
+
+    Records fitting on one line are split with str.find. Everything else,
+    like escape characters or quoted fields spanning lines, goes through the
+    state machine of Reader, which in turn consumes quoted text in slices.
+    Output is identical to Reader."""
+
+    def __init__(self, iterator, dialect=None, **kwargs):
+        super(ScanningReader, self).__init__(iterator, dialect, **kwargs)
+        dialect = self.dialect
+        self._use_fast_path = (dialect.quoting != QUOTE_NONNUMERIC
+                               and not dialect.skipinitialspace)
+        if dialect.quoting == QUOTE_NONE:
+            self._quotechar = None
+        else:
+            self._quotechar = dialect.quotechar
+        self._escapechar = dialect.escapechar
+        specials = [c for c in (self._quotechar, self._escapechar) if c]
+        self._quoted_stop = re.compile("|".join(re.escape(c) for c in specials))
+        self._columns = None
+        self._maxsplit = -1
+
+    def select_columns(self, indices):
+        """Return only the fields at indices, in that order, from now on.
+
+        Lines are split no further than the last selected field. Fields
+        missing in short records become None."""
+        self._columns = list(indices)
+        self._maxsplit = max(self._columns) + 1
+
+    def set_strip(self, indices=None):
+        """Strip whitespace off the fields at indices, or off all fields if
+        None, while splitting records. Indices count before select_columns."""
+        self._strip = True if indices is None else frozenset(indices)
+
+    def skip(self, count):
+        """Skip count records without splitting them into fields.
+
+        Only lines holding no quote or special character are passed over
+        as they are, all others are parsed like next() does, so skipping
+        never changes the records read afterwards."""
+        if not self._use_fast_path or self._escapechar:
+            for _ in range(count):
+                self.next()
+            return
+        quotechar = self._quotechar
+        input_iter = self.input_iter
+        for _ in range(count):
+            line = next(input_iter)
+            self.line_num += 1
+            body = line.rstrip("\r\n")
+            if ((quotechar and quotechar in body) or "\r" in body
+                    or "\n" in body or "\0" in body):
+                self._parse_reset()
+                if self._scan_line(line) is None:
+                    self._parse_lines(line)
+
+    def next(self):
+        self._parse_reset()
+        if self._use_fast_path:
+            line = next(self.input_iter)
+            self.line_num += 1
+            fields = self._scan_line(line)
+            if fields is None:
+                fields = self._parse_lines(line)
+        else:
+            fields = self._parse_lines(None)
+        if self._columns is not None and fields:
+            count = len(fields)
+            fields = [fields[i] if i < count else None for i in self._columns]
+        return fields
+
+    def _scan_line(self, line):
+        body = line.rstrip("\r\n")
+        if ("\r" in body or "\n" in body or "\0" in body
+                or len(body) > _field_limit
+                or (self._escapechar and self._escapechar in body)):
+            return None
+        if not body:
+            return []
+        fields = _split_line(body, self.dialect.delimiter, self._quotechar,
+                             self.dialect.doublequote, self._maxsplit)
+        strip = self._strip
+        if strip is None or fields is None:
+            return fields
+        elif strip is True:
+            return [field.strip() for field in fields]
+        count = len(fields)
+        for index in strip:
+            if index < count:
+                fields[index] = fields[index].strip()
+        return fields
+
+    def _parse_lines(self, line):
+        """Run the state machine, starting with an already counted line"""
+        while True:
+            if line is None:
+                try:
+                    line = next(self.input_iter)
+                except StopIteration:
+                    if len(self.field) > 0:
+                        raise Error("newline inside string")
+                    raise
+                self.line_num += 1
+
+            if '\0' in line:
+                raise Error("line contains NULL byte")
+            pos = 0
+            while pos < len(line):
+                pos = self._parse_process_char(line, pos)
+            self._parse_eol()
+            line = None
+
+            if self.state == self.START_RECORD:
+                break
+
+        fields = self.fields
+        self.fields = []
+        return fields
+
+    def _parse_process_char(self, line, pos):
+        if self.state == self.IN_QUOTED_FIELD:
+            stop = self._quoted_stop.search(line, pos)
+            end = stop.start() if stop else len(line)
+            if end > pos:
+                self._parse_add_char(line[pos:end])
+                return end
+        return Reader._parse_process_char(self, line, pos)
+
+
 class Writer(object):
     """CSV writer
 
     Writer objects are responsible for generating tabular data
     in CSV format from sequence input."""
 
+    rows_per_write = 1000  # rows joined into one write call by writerows
+
     def __init__(self, file, dialect=None, **kwargs):
         if not (hasattr(file, 'write') and callable(file.write)):
             raise TypeError("argument 1 must have a 'write' method")
         self.writeline = file.write
         self.dialect = _call_dialect(dialect, kwargs)
+        self._prepare_escaping()
 
-    def _join_reset(self):
-        self.rec = []
-        self.num_fields = 0
-
-    def _join_append(self, field, quoted, quote_empty):
+    def _prepare_escaping(self):
+        """Work out the escape rules of the dialect once, instead of per field"""
         dialect = self.dialect
-        # If this is not the first field we need a field separator
-        if self.num_fields > 0:
-            self.rec.append(dialect.delimiter)
-
         if dialect.quoting == QUOTE_NONE:
-            need_escape = tuple(dialect.lineterminator) + (
-                dialect.escapechar,  # escapechar always first
-                dialect.delimiter, dialect.quotechar)
-
+            # escapechar always first
+            chars = [dialect.escapechar] + list(dialect.lineterminator) + [
+                dialect.delimiter, dialect.quotechar]
+            self._quote_triggers = ()
         else:
-            for c in tuple(dialect.lineterminator) + (
-                dialect.delimiter, dialect.escapechar):
-                if c and c in field:
-                    quoted = True
-
-            need_escape = ()
-            if dialect.quotechar in field:
-                if dialect.doublequote:
-                    field = field.replace(dialect.quotechar,
-                                          dialect.quotechar * 2)
+            chars = list(dialect.lineterminator) + [
+                dialect.delimiter, dialect.escapechar, dialect.quotechar]
+            self._quote_triggers = tuple(
+                c for c in list(dialect.lineterminator) + [
+                    dialect.delimiter, dialect.escapechar] if c)
+        need_escape = []
+        for c in chars:
+            if c and c not in need_escape:
+                need_escape.append(c)
+        if dialect.quoting != QUOTE_NONE:
+            need_escape = [dialect.quotechar] if not dialect.doublequote else []
+        self._need_escape = tuple(c for c in need_escape if c)
+        # fields without any of these characters are written as they are
+        specials = set(c for c in chars if c)
+        self._special = re.compile(
+            "|".join(re.escape(c) for c in sorted(specials))).search
+
+    def _join_field(self, field, quoted, quote_empty):
+        dialect = self.dialect
+        if quoted or self._special(field):
+            for c in self._quote_triggers:
+                if c in field:
                     quoted = True
-                else:
-                    need_escape = (dialect.quotechar,)
+                    break
 
+            quotechar = dialect.quotechar
+            if (dialect.quoting != QUOTE_NONE and dialect.doublequote
+                    and quotechar in field):
+                field = field.replace(quotechar, quotechar * 2)
+                quoted = True
 
-        for c in need_escape:
-            if c and c in field:
-                if not dialect.escapechar:
-                    raise Error("need to escape, but no escapechar set")
-                field = field.replace(c, dialect.escapechar + c)
+            for c in self._need_escape:
+                if c in field:
+                    if not dialect.escapechar:
+                        raise Error("need to escape, but no escapechar set")
+                    field = field.replace(c, dialect.escapechar + c)
 
         # If field is empty check if it needs to be quoted
         if field == '' and quote_empty:
@@ -478,32 +723,28 @@ class Writer(object):
 
         if quoted:
             field = dialect.quotechar + field + dialect.quotechar
+        return field
 
-        self.rec.append(field)
-        self.num_fields += 1
-
-
-
-    def writerow(self, row):
+    def _join_row(self, row):
         dialect = self.dialect
         try:
             rowlen = len(row)
         except TypeError:
             raise Error("sequence expected")
 
-        # join all fields in internal buffer
-        self._join_reset()
-
+        quoting = dialect.quoting
+        join_field = self._join_field
+        fields = []
         for field in row:
             quoted = False
-            if dialect.quoting == QUOTE_NONNUMERIC:
+            if quoting == QUOTE_NONNUMERIC:
                 try:
                     float(field)
                 except:
                     quoted = True
                 # This changed since 2.5:
                 # quoted = not isinstance(field, (int, long, float))
-            elif dialect.quoting == QUOTE_ALL:
+            elif quoting == QUOTE_ALL:
                 quoted = True
 
             if field is None:
@@ -512,16 +753,25 @@ class Writer(object):
                 value = repr(field)
             else:
                 value = str(field)
-            self._join_append(value, quoted, rowlen == 1)
+            fields.append(join_field(value, quoted, rowlen == 1))
 
         # add line terminator
-        self.rec.append(dialect.lineterminator)
+        return dialect.delimiter.join(fields) + dialect.lineterminator
 
-        self.writeline(''.join(self.rec))
+    def writerow(self, row):
+        self.writeline(self._join_row(row))
 
     def writerows(self, rows):
+        """Write rows, joining up to rows_per_write of them into one write call"""
+        join_row = self._join_row
+        lines = []
         for row in rows:
-            self.writerow(row)
+            lines.append(join_row(row))
+            if len(lines) == self.rows_per_write:
+                self.writeline(''.join(lines))
+                lines = []
+        if lines:
+            self.writeline(''.join(lines))
 
 def reader(*args, **kwargs):
     """
@@ -0,0 +1,149 @@
+"""
+    tablereader._row_index
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Byte offsets of CSV records, for jumping straight to a row
+
+    Records are found on the raw bytes, a record continues on the next line as
+    long as it ends within a quoted field. As in the parser, a quote character
+    only opens a quoted field at the start of a field. The offsets of every nth
+    row are kept in arrays and can be persisted in a sidecar file next to the CSV
+    file, which is only used as long as size and mtime of the CSV file match.
+
+    :license: BSD-3
+"""
+
+#
+# Python imports
+from array import array
+import codecs
+import mmap
+import os
+import struct
+import sys
+
+#
+# local imports
+from tablereader._csv_from_pypy import _ends_quoted
+
+#
+# constants
+INDEX_SUFFIX = ".rowidx"
+INDEX_FORMAT = 2  # bump on incompatible changes of the sidecar file
+INDEX_HEADER = struct.Struct("<4sHxx1s1sxxIIQdQ")  # magic, format, quotechar, delimiter, every, header records, size, mtime, rows
+INDEX_MAGIC = b"TRIX"
+
+
+def _le_bytes(values):
+    """Array contents in little endian byte order"""
+
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class RowIndex(object):
+    """Byte offset and number of preceding lines of every nth row of a CSV file
+
+    Rows are counted like DictReader does, skipping header_records rows first and empty lines throughout.
+    """
+
+    def __init__(self, every, offsets, lines, rows, key):
+        self.every = every
+        self.offsets = offsets
+        self.lines = lines
+        self.rows = rows
+        self.key = key
+
+    @staticmethod
+    def fingerprint(filename, quote, delimiter, every, header_records):
+        stat = os.stat(filename)
+        return (quote or b"\0", delimiter, every, header_records, stat.st_size, stat.st_mtime)
+
+    @classmethod
+    def build(cls, filename, quote, delimiter, every=1, header_records=1, skip_bom=False):
+        """Scan filename for record boundaries, quote and delimiter being encoded"""
+
+        key = cls.fingerprint(filename, quote, delimiter, every, header_records)
+        offsets = array("Q")
+        lines = array("Q")
+        row = -header_records
+        line = 0
+        with open(filename, "rb") as filehandle:
+            if os.fstat(filehandle.fileno()).st_size:
+                buf = mmap.mmap(filehandle.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buf = b""  # empty files cannot be mapped
+            try:
+                size = len(buf)
+                offset = len(codecs.BOM_UTF8) if skip_bom and buf[:len(codecs.BOM_UTF8)] == codecs.BOM_UTF8 else 0
+                first = offset  # where the first field starts
+                while offset < size:
+                    start = offset
+                    first_line = line
+                    quoted = False
+                    while True:
+                        end = buf.find(b"\n", offset) + 1 or size
+                        if quote:
+                            quoted = _ends_quoted(buf, delimiter, quote, quoted, offset, end, first)
+                        offset = end
+                        line += 1
+                        if not quoted or end >= size:
+                            break
+                    if offset - start <= 2 and not buf[start:offset].strip(b"\r\n"):
+                        continue  # empty line, skipped by DictReader
+                    if row >= 0 and not row % every:
+                        offsets.append(start)
+                        lines.append(first_line)
+                    row += 1
+            finally:
+                if isinstance(buf, mmap.mmap):
+                    buf.close()
+        return cls(every, offsets, lines, max(row, 0), key)
+
+    @classmethod
+    def load(cls, path, key):
+        """Index stored at path, None if there is none or it does not match key"""
+
+        try:
+            with open(path, "rb") as filehandle:
+                header = filehandle.read(INDEX_HEADER.size)
+                if len(header) != INDEX_HEADER.size:
+                    return None
+                magic, version, quote, delimiter, every, header_records, size, mtime, rows = INDEX_HEADER.unpack(header)
+                if magic != INDEX_MAGIC or version != INDEX_FORMAT or (quote, delimiter, every, header_records, size, mtime) != key:
+                    return None
+                count = (rows + every - 1) // every
+                offsets = array("Q")
+                offsets.frombytes(filehandle.read(count * offsets.itemsize))
+                lines = array("Q")
+                lines.frombytes(filehandle.read(count * lines.itemsize))
+        except (IOError, OSError, ValueError):
+            return None
+        if len(offsets) != count or len(lines) != count:
+            return None
+        if sys.byteorder == "big":
+            offsets.byteswap()
+            lines.byteswap()
+        return cls(every, offsets, lines, rows, key)
+
+    def save(self, path):
+        """Store the index at path, written to a temporary file first so readers never see a partial one"""
+
+        quote, delimiter, every, header_records, size, mtime = self.key
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp_path, "wb") as filehandle:
+            filehandle.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_FORMAT, quote, delimiter, every, header_records, size, mtime,
+                                               self.rows))
+            filehandle.write(_le_bytes(self.offsets))
+            filehandle.write(_le_bytes(self.lines))
+        if os.path.exists(path):
+            os.remove(path)  # os.rename does not replace files on Windows
+        os.rename(tmp_path, path)
+
+    def locate(self, row):
+        """Byte offset and preceding lines of the indexed row at or before row, and the number of rows in between"""
+
+        entry = row // self.every
+        return self.offsets[entry], self.lines[entry], row - entry * self.every
@@ -0,0 +1,207 @@
+"""
+    tablereader._sheet_cache
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    On-disk cache of parsed sheet rows
+
+    Rows are stored in pickled column blocks, keyed by path, size and mtime of the
+    source file and optionally a hash of its content. Later opens stream the blocks
+    back without touching the spreadsheet parser.
+
+    :license: BSD-3
+"""
+
+#
+# Python imports
+import hashlib
+import os
+import tempfile
+
+#
+# environment imports
+from six.moves import cPickle as pickle, zip
+
+#
+# constants
+CACHE_FORMAT = 1  # bump on incompatible changes of the stored blocks
+CACHE_SUFFIX = ".rows"
+
+
+class SheetCache(object):
+    """Directory of cached sheets, evicting least recently used entries above max_size bytes"""
+
+    block_size = 4096
+
+    def __init__(self, directory, max_size=1024 * 1024 * 1024, hash_content=False):
+        self.directory = directory
+        self.max_size = max_size
+        self.hash_content = hash_content
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def key(self, filename, *options):
+        """Fingerprint of filename and the reader options influencing its rows"""
+
+        stat = os.stat(filename)
+        parts = [CACHE_FORMAT, os.path.abspath(filename), stat.st_size, stat.st_mtime]
+        if self.hash_content:
+            digest = hashlib.sha1()
+            with open(filename, "rb") as filehandle:
+                for block in iter(lambda: filehandle.read(1024 * 1024), b""):
+                    digest.update(block)
+            parts.append(digest.hexdigest())
+        parts.extend(options)
+        return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def reader(self, key):
+        """CachedSheetReader for key, or None if it is not cached"""
+
+        path = self.path(key)
+        try:
+            os.utime(path, None)  # mark as recently used
+            return CachedSheetReader(path)
+        except (IOError, OSError):
+            return None
+
+    def recorder(self, key, reader):
+        """Wrap reader to store its rows under key once it is read completely"""
+
+        return CachingReader(reader, self, key)
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits into max_size"""
+
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(CACHE_SUFFIX):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+
+
+def _dump_block(rows, filehandle):
+    """Store rows column-wise if they are all of the same width"""
+
+    width = len(rows[0])
+    if all(len(row) == width for row in rows):
+        pickle.dump((width, [list(column) for column in zip(*rows)], len(rows)), filehandle, pickle.HIGHEST_PROTOCOL)
+    else:
+        pickle.dump((None, rows, len(rows)), filehandle, pickle.HIGHEST_PROTOCOL)
+
+
+class CachingReader(object):
+    """Mimic _csv.reader interface, passing rows of reader on while writing them to the cache"""
+
+    def __init__(self, reader, cache, key):
+        self.reader = reader
+        self._cache = cache
+        self._key = key
+        self._block = []
+        fd, self._tmp_path = tempfile.mkstemp(dir=cache.directory, suffix=".tmp")
+        self._file = os.fdopen(fd, "wb")
+
+    @property
+    def line_num(self):
+        return self.reader.line_num
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def next(self):
+        try:
+            row = next(self.reader)
+        except StopIteration:
+            self._finish()
+            raise
+        if self._file is not None:
+            self._block.append(row)
+            if len(self._block) == self._cache.block_size:
+                _dump_block(self._block, self._file)
+                self._block = []
+        return row
+
+    def _finish(self):
+        if self._file is None:
+            return
+        if self._block:
+            _dump_block(self._block, self._file)
+            self._block = []
+        self._file.close()
+        self._file = None
+        os.rename(self._tmp_path, self._cache.path(self._key))
+        self._cache.evict()
+
+    def close(self):
+        """Drop the partially written entry, rows are only cached if read completely"""
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self._tmp_path)
+        backend_close = getattr(self.reader, "close", None)
+        if backend_close is not None:
+            backend_close()
+
+    def __del__(self):
+        if getattr(self, "_file", None) is not None:
+            self.close()
+
+
+class CachedSheetReader(object):
+    """Mimic _csv.reader interface, streaming rows back from a cache entry"""
+
+    def __init__(self, path):
+        self.line_num = 0
+        self._file = open(path, "rb")
+        self._rows = self._iter_rows()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def next(self):
+        row = next(self._rows)
+        self.line_num += 1
+        return row
+
+    def _iter_rows(self):
+        try:
+            while True:
+                try:
+                    width, data, count = pickle.load(self._file)
+                except EOFError:
+                    return
+                if width is None:
+                    for row in data:
+                        yield row
+                elif width:
+                    for row in zip(*data):
+                        yield list(row)
+                else:
+                    for _ in range(count):
+                        yield []
+        finally:
+            self._file.close()
+
+    def close(self):
+        self._file.close()
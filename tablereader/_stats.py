@@ -0,0 +1,136 @@
+"""
+    tablereader._stats
+    ~~~~~~~~~~~~~~~~~~
+
+    Per-stage timings and counters of a TableReader
+
+    Stages are timed by wrapping the functions doing the work, so readers without
+    stats do not pay for them. Times are exclusive, time spent in a nested stage,
+    like stringification within a row fetch, only counts for the nested one.
+
+    :license: BSD-3
+"""
+
+#
+# Python imports
+import time
+
+#
+# constants
+STAGES = ("open", "fetch", "stringify", "strip", "dict")
+
+clock = getattr(time, "perf_counter", time.time)  # Python 2 lacks perf_counter
+
+
+class ReaderStats(object):
+    """Wall clock seconds per stage, numbers of rows and cells read, the size of the file and the bytes read of it
+
+    file_size is that of the whole file, also if only part of it is read, e.g. with max_rows. bytes_read includes
+    what CSV parsers buffer ahead, up to about 1 MiB, and counts xls and xlsx files in full, their workbooks are
+    loaded on opening. Both are 0 for StringIO.
+
+    :open: opening the file and workbook, e.g. xlrd2.open_workbook or openpyxl.load_workbook
+    :fetch: reading and parsing rows in the backend
+    :stringify: converting cell values to strings or native values, xls and xlsx only
+    :strip: stripping whitespace off xls columns and rows of cached sheets, other backends strip within fetch or stringify
+    :dict: building the rows returned, e.g. DictReader's dict construction
+    """
+
+    interval = 10000  # rows between calls of the on_stats callback
+
+    def __init__(self):
+        self.timings = dict.fromkeys(STAGES, 0.0)
+        self.rows = 0
+        self.cells = 0
+        self.file_size = 0
+        self.position = None  # callable returning the bytes read so far, set by the reader
+        self._bytes_read = 0
+        self._nested = 0.0  # time spent in nested stages of the running one
+
+    @property
+    def bytes_read(self):
+        if self.position is not None:
+            try:
+                self._bytes_read = self.position()
+            except ValueError:  # the file is closed already
+                self.position = None
+        return self._bytes_read
+
+    def freeze(self):
+        """Keep bytes_read as it is from now on, e.g. before the file read is closed"""
+
+        self._bytes_read = self.bytes_read
+        self.position = None
+
+    def add(self, stage, seconds):
+        self.timings[stage] += seconds
+
+    def timed(self, stage, function):
+        """Wrap function to add its time, minus that of nested timed functions, to stage"""
+
+        timings = self.timings
+
+        def timed_function(*args, **kwargs):
+            outer = self._nested
+            self._nested = 0.0
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                timings[stage] += elapsed - self._nested
+                self._nested = outer + elapsed
+        return timed_function
+
+    @property
+    def total(self):
+        return sum(self.timings.values())
+
+    def as_dict(self):
+        result = dict(self.timings)
+        result.update(rows=self.rows, cells=self.cells, file_size=self.file_size, bytes_read=self.bytes_read, total=self.total)
+        return result
+
+    def __repr__(self):
+        return "<ReaderStats %d rows, %d cells, %d of %d bytes read, %s>" % (
+            self.rows, self.cells, self.bytes_read, self.file_size, ", ".join("%s %.3fs" % (stage, self.timings[stage]) for stage in STAGES))
+
+
+class StatsReader(object):
+    """Mimic _csv.reader interface, timing row fetches of reader and counting its rows and cells
+
+    Calls on_stats with the stats every ReaderStats.interval rows and once the reader is exhausted.
+    """
+
+    def __init__(self, reader, stats, on_stats=None):
+        self.reader = reader
+        self.stats = stats
+        self.on_stats = on_stats
+        self._fetch = stats.timed("fetch", reader.__next__ if hasattr(reader, "__next__") else reader.next)
+        self._reported = False
+
+    def __getattr__(self, name):
+        if name == "reader":
+            raise AttributeError(name)
+        return getattr(self.reader, name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def next(self):
+        try:
+            row = self._fetch()
+        except StopIteration:
+            if self.on_stats is not None and not self._reported:
+                self._reported = True
+                self.on_stats(self.stats)
+            raise
+        stats = self.stats
+        stats.rows += 1
+        stats.cells += len(row)
+        if self.on_stats is not None and not stats.rows % stats.interval:
+            self.on_stats(stats)
+        return row
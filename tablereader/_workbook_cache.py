@@ -0,0 +1,134 @@
+"""
+    tablereader._workbook_cache
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Open workbooks shared by the readers of one process
+
+    Books are keyed by path, size and mtime of the file and the options they were
+    opened with, so reading the sheet names and then several sheets parses the
+    workbook only once. Books beyond max_books, or beyond max_size bytes of file
+    size, are closed least recently used first, but not before the last reader
+    using them released them.
+
+    The workbook_cache shared by the process keeps no books unless its max_books
+    is raised, so closing a reader closes its file, e.g. to delete or rewrite it
+    on Windows.
+
+    :license: BSD-3
+"""
+
+#
+# Python imports
+from collections import OrderedDict
+import os
+import threading
+
+
+class _Entry(object):
+
+    def __init__(self, key, book, closer, size):
+        self.key = key
+        self.book = book
+        self.closer = closer
+        self.size = size
+        self.users = 0
+        self.cached = True
+
+
+class WorkbookCache(object):
+    """Open workbooks, least recently used ones closed above max_books books or max_size bytes of file size
+
+    max_books=0 disables sharing, every book is closed once its reader releases it.
+    """
+
+    def __init__(self, max_books=8, max_size=256 * 1024 * 1024):
+        self.max_books = max_books
+        self.max_size = max_size
+        self.lock = threading.RLock()  # also held by readers loading sheets of a shared book
+        self._entries = OrderedDict()  # key to _Entry, least recently used first
+        self._in_use = {}  # id of a book handed out to its _Entry
+        self._pid = os.getpid()
+
+    @staticmethod
+    def key(filename, kind, *options):
+        """Fingerprint of filename and the options its book is opened with"""
+
+        stat = os.stat(filename)
+        return (os.path.abspath(filename), stat.st_size, stat.st_mtime, kind) + options
+
+    def acquire(self, filename, kind, opener, *options):
+        """Book for filename, opened through opener() returning book and a function closing it if none is cached
+
+        Hand the book back through release() once done with it.
+        """
+
+        key = self.key(filename, kind, *options)
+        with self.lock:
+            self._check_process()
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self._drop_stale(key)
+                book, closer = opener()
+                entry = _Entry(key, book, closer, key[1])
+            self._entries[key] = entry
+            entry.users += 1
+            self._in_use[id(entry.book)] = entry
+            self._evict()
+            return entry.book
+
+    def release(self, book):
+        """Hand back a book of acquire(), it is closed if it was evicted meanwhile"""
+
+        with self.lock:
+            entry = self._in_use.get(id(book))
+            if entry is None or entry.book is not book:
+                return
+            entry.users -= 1
+            if not entry.users:
+                del self._in_use[id(book)]
+                if not entry.cached:
+                    entry.closer()
+
+    def invalidate(self, filename=None):
+        """Drop the books of filename, or all books, they are closed once no reader uses them anymore"""
+
+        path = os.path.abspath(filename) if filename is not None else None
+        with self.lock:
+            for key in list(self._entries):
+                if path is None or key[0] == path:
+                    self._discard(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key)
+        entry.cached = False
+        if not entry.users:
+            entry.closer()
+
+    def _drop_stale(self, current):
+        """Discard books of other versions of the file current is the key of"""
+
+        for key in list(self._entries):
+            if key[0] == current[0] and key[1:3] != current[1:3]:
+                self._discard(key)
+
+    def _evict(self):
+        size = sum(entry.size for entry in self._entries.values())
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_books and size <= self.max_size:
+                break
+            size -= self._entries[key].size
+            self._discard(key)
+
+    def _check_process(self):
+        """Forget books inherited from a parent process, their file handles are shared with it"""
+
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._entries = OrderedDict()
+            self._in_use = {}
+
+
+workbook_cache = WorkbookCache(max_books=0)  # shared by all readers of the process unless they are given another one
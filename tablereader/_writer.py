@@ -0,0 +1,187 @@
+"""
+    tablereader._writer
+    ~~~~~~~~~~~~~~~~~~~
+
+    TableWriter, the counterpart of TableReader
+
+    Rows are written in bulk, CSV through csv.writer or the vendored pure Python
+    writer, xlsx through openpyxl's write-only mode, which streams rows to disk
+    and keeps memory usage constant.
+
+    :license: BSD-3
+"""
+
+#
+# Python imports
+import csv
+import io
+from itertools import islice
+import locale
+import os
+
+#
+# environment imports
+import openpyxl
+from six import PY2
+from six.moves import zip
+
+#
+# local imports
+import tablereader._csv_from_pypy as _csv
+
+#
+# constants
+WRITER_TYPES = {".csv": "csv", ".txt": "csv", ".xlsx": "xlsx", ".xlsm": "xlsx"}
+
+
+class TableWriter(object):
+    """Consolidated interface for writing csv and xlsx
+
+    Takes dicts, sequences and column-oriented batches as returned by TableReader.iter_batches().
+    Use as context manager or call close() to finish the file.
+    """
+
+    buffer_rows = 1000  # rows passed to the backend in one go
+
+    def __init__(self, filename, fieldnames=None, force_type=None, sheet=None, write_header=True, delimiter=";", quotechar='"',
+                 encoding=None, lineterminator="\r\n"):
+        """Optional parameter description:
+
+        :fieldnames: Column names in output order, taken from the first dict row or batch if not given
+        :force_type: Enforce a certain file format instead of taking it from the extension. Options are "CSV", "unicodecsv",
+                     the latter writing through the pure Python writer, and "XLSX"
+        :sheet: Name of the sheet written to xlsx files
+        :write_header: Write fieldnames as first row
+        :delimiter: Delimiter used on CSV writing
+        :quotechar: Quote character used on CSV writing
+        :encoding: Encoding of CSV files, defaults to the locale's preferred one
+        :lineterminator: Line break written after each CSV row
+
+        A file object may be given instead of a filename, CSV needs a text one and force_type then.
+        """
+
+        if force_type:
+            force_type = force_type.lower().strip()
+        is_file = hasattr(filename, "write")
+        if force_type is None:
+            if is_file:
+                raise ValueError("File object given but no forced type, I cannot guess!")
+            force_type = WRITER_TYPES.get(os.path.splitext(filename)[1].lower())
+        if force_type not in ("csv", "unicodecsv", "xlsx"):
+            raise NotImplementedError("Unsupported file extension and no known type given as parameter")
+
+        self.filename = filename
+        self.kind = force_type
+        self.fieldnames = list(fieldnames) if fieldnames is not None else None
+        self.write_header = write_header
+        self.line_num = 0  # rows written, including the header
+        self._pending = []  # rows collected by writerow()
+        self._own_file = not is_file
+        self.filehandle = None
+        self._workbook = None
+        if force_type == "xlsx":
+            self._workbook = openpyxl.Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet(sheet or "Sheet1")
+            self._write = self._write_xlsx
+        else:
+            if is_file:
+                self.filehandle = filename
+            elif PY2:
+                self.filehandle = open(filename, "wb")
+            else:
+                self.filehandle = io.open(filename, "w", encoding=encoding or locale.getpreferredencoding(False), newline="")
+            module = _csv if force_type == "unicodecsv" else csv
+            self._writer = module.writer(self.filehandle, delimiter=delimiter, quotechar=quotechar, lineterminator=lineterminator)
+            self._write = self._writer.writerows
+        self._header_written = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def writerow(self, row):
+        """Write a dict or a sequence of values in fieldnames order"""
+
+        if self._write is None:
+            raise ValueError("I/O operation on closed TableWriter")
+        if self.fieldnames is None:
+            self._set_fieldnames(row)
+        self._pending.append(self._values(row) if hasattr(row, "keys") else row)
+        if len(self._pending) >= self.buffer_rows:
+            self.flush()
+
+    def writerows(self, rows):
+        """Write an iterable of dicts or sequences"""
+
+        self.flush()
+        rows = iter(rows)
+        if self.fieldnames is None:
+            for row in rows:
+                self.writerow(row)
+                break
+            self.flush()
+        self._write_rows(self._values(row) if hasattr(row, "keys") else row for row in rows)
+
+    def write_batch(self, batch):
+        """Write a column-oriented batch, mapping each fieldname to a list of values"""
+
+        self.flush()
+        if self.fieldnames is None:
+            self.fieldnames = list(batch)
+        self._write_rows(zip(*[batch[name] for name in self.fieldnames]))
+
+    def flush(self):
+        """Write rows collected by writerow()"""
+
+        if self._pending:
+            pending, self._pending = self._pending, []
+            self._write_rows(pending)
+        elif self.fieldnames is not None and not self._header_written:
+            self._write_rows([])
+
+    def close(self):
+        """Write remaining rows and finish the file, a file object given is left open"""
+
+        if self._write is None:
+            return
+        self.flush()
+        if self._workbook is not None:
+            self._workbook.save(self.filename)
+            self._workbook = None
+        elif self._own_file:
+            self.filehandle.close()
+        self._write = None
+
+    def _set_fieldnames(self, row):
+        if hasattr(row, "keys"):
+            self.fieldnames = list(row.keys())
+        else:
+            self.write_header = False  # nothing to write as header
+
+    def _values(self, row):
+        get = row.get
+        return [get(name) for name in self.fieldnames]
+
+    def _write_rows(self, rows):
+        if self._write is None:
+            raise ValueError("I/O operation on closed TableWriter")
+        if not self._header_written:
+            self._header_written = True
+            if self.write_header and self.fieldnames is not None:
+                self._write([self.fieldnames])
+                self.line_num += 1
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.buffer_rows))
+            if not chunk:
+                break
+            self._write(chunk)
+            self.line_num += len(chunk)
+
+    def _write_xlsx(self, rows):
+        append = self._sheet.append
+        for row in rows:
+            append(row)
+
@@ -0,0 +1,398 @@
+"""
+    tablereader._xlsx_stream
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Streaming xlsx sheet reader working on the zipped XML directly
+
+    Produces the same rows as tablereader.XLSXReader without creating openpyxl
+    cell objects. Sheet XML is parsed incrementally and processed rows are
+    dropped from the tree right away, so memory stays flat for any sheet size.
+
+    :license: BSD-3
+"""
+
+#
+# Python imports
+from datetime import datetime
+import posixpath
+import zipfile
+from xml.etree.ElementTree import fromstring, iterparse
+
+#
+# environment imports
+from openpyxl.styles.numbers import builtin_format_code, is_date_format, is_timedelta_format
+from openpyxl.utils.cell import column_index_from_string, range_boundaries
+from openpyxl.utils.datetime import from_excel, from_ISO8601, CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
+from openpyxl.worksheet._reader import WorkSheetParser
+from six import next as six_next, string_types as six_string_types
+
+#
+# constants
+CLEAR_STRING = ""
+SHEET_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PACKAGE_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+SHEET_TAG = "{%s}sheet" % SHEET_MAIN_NS
+WORKBOOK_PR_TAG = "{%s}workbookPr" % SHEET_MAIN_NS
+RELATIONSHIP_TAG = "{%s}Relationship" % PACKAGE_REL_NS
+REL_ID_ATTR = "{%s}id" % REL_NS
+NUMFMT_TAG = "{%s}numFmt" % SHEET_MAIN_NS
+CELLXFS_TAG = "{%s}cellXfs" % SHEET_MAIN_NS
+XF_TAG = "{%s}xf" % SHEET_MAIN_NS
+DIMENSION_TAG = "{%s}dimension" % SHEET_MAIN_NS
+DATA_TAG = "{%s}sheetData" % SHEET_MAIN_NS
+ROW_TAG = "{%s}row" % SHEET_MAIN_NS
+VALUE_TAG = "{%s}v" % SHEET_MAIN_NS
+FORMULA_TAG = "{%s}f" % SHEET_MAIN_NS
+INLINE_STRING_TAG = "{%s}is" % SHEET_MAIN_NS
+STRING_ITEM_TAG = "{%s}si" % SHEET_MAIN_NS
+TEXT_TAG = "{%s}t" % SHEET_MAIN_NS
+RUN_TAG = "{%s}r" % SHEET_MAIN_NS
+
+DIGITS = "0123456789"
+NUMBER_OR_SHARED_TYPES = frozenset((None, "n", "s"))
+
+_column_indices = {}  # column letters to index, shared by all readers
+
+
+def _cast_number(value):
+    """Convert numbers as string to an int or float, same as openpyxl does"""
+
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+def _column_index(ref):
+    """1-based column index of a cell reference like AB12"""
+
+    letters = ref.rstrip(DIGITS)
+    try:
+        return _column_indices[letters]
+    except KeyError:
+        index = _column_indices[letters] = column_index_from_string(letters)
+        return index
+
+
+def _text_content(element):
+    """Plain text of a string item, equal to openpyxl's Text.content"""
+
+    snippets = []
+    text = element.findtext(TEXT_TAG)
+    if text:
+        snippets.append(text)
+    for run in element.iterfind(RUN_TAG):
+        text = run.findtext(TEXT_TAG)
+        if text:
+            snippets.append(text)
+    return "".join(snippets)
+
+
+def _part_path(base, target):
+    """Resolve a relationship target against the directory of its source part"""
+
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base), target))
+
+
+class XLSXStreamReader(object):
+    """Mimic _csv.reader interface for DictReader to be able to handle an xlsx sheet
+
+    Drop-in replacement for XLSXReader parsing the sheet XML straight out of the zip.
+    """
+
+    def __init__(self, filename, sheetname=None, typed=False):
+        self.line_num = 0
+        self.filename = filename
+        self.sheetname = sheetname
+        self.typed = typed
+        self._empty = None if typed else CLEAR_STRING
+        self._archive = zipfile.ZipFile(filename)
+        try:
+            sheets = self._read_workbook()
+            self.sheetnames = [name for name, _ in sheets]
+            if sheetname is None:
+                sheet_path = sheets[0][1]
+            else:
+                sheet_path = dict(sheets).get(sheetname)
+                if sheet_path is None:
+                    raise ValueError("No such sheet %s" % sheetname)
+            self._read_styles()
+            self._read_shared_strings()
+        except Exception:
+            self._archive.close()
+            raise
+        self._sheet_path = sheet_path
+        # openpyxl's parser, only used to render formulas including shared ones
+        self._formula_parser = WorkSheetParser(None, self._shared_strings)
+        self._positions = None  # 1-based column index to position in the row, if columns are selected
+        self._strip = None  # True or 1-based column indices to strip whitespace of
+        self._first_row = 0  # rows above are skipped without converting them
+        self._last_row = None
+        self._iter = self._iter_rows()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def next(self):
+        if self._last_row is not None and self.line_num >= self._last_row:
+            self._iter.close()
+            raise StopIteration
+        items = self.stringified_row()
+        self.line_num += 1
+        return items
+
+    def stringified_row(self):
+        """Ensure row contents are all strings"""
+
+        return six_next(self._iter)
+
+    def select_columns(self, indices):
+        """Only convert the cells at indices from now on, rows hold them in that order"""
+
+        self._positions = dict((index + 1, position) for position, index in enumerate(indices))
+        if self._empty_row:
+            self._empty_row = [self._empty] * len(self._positions)
+
+    def set_strip(self, indices=None):
+        """Strip whitespace off string cells of the columns at indices, or of all columns if None, when converting them"""
+
+        self._strip = True if indices is None else frozenset(index + 1 for index in indices)
+
+    def restrict(self, skip, count=None):
+        """Skip the next skip rows without converting them and stop after count more rows"""
+
+        self._first_row = self.line_num + skip + 1
+        for _ in range(skip):
+            try:
+                six_next(self._iter)
+            except StopIteration:
+                break
+            self.line_num += 1
+        if count is not None:
+            self._last_row = self.line_num + count
+
+    def close(self):
+        self._archive.close()
+
+    def _read_workbook(self):
+        """Return (name, part path) of all sheets and pick up part locations"""
+
+        relations = {}
+        self._shared_strings_path = "xl/sharedStrings.xml"
+        self._styles_path = "xl/styles.xml"
+        tree = fromstring(self._archive.read("xl/_rels/workbook.xml.rels"))
+        for relation in tree.iter(RELATIONSHIP_TAG):
+            path = _part_path("xl/workbook.xml", relation.get("Target"))
+            relations[relation.get("Id")] = path
+            reltype = relation.get("Type", "")
+            if reltype.endswith("/sharedStrings"):
+                self._shared_strings_path = path
+            elif reltype.endswith("/styles"):
+                self._styles_path = path
+
+        tree = fromstring(self._archive.read("xl/workbook.xml"))
+        self._epoch = CALENDAR_WINDOWS_1900
+        for properties in tree.iter(WORKBOOK_PR_TAG):
+            if properties.get("date1904") in ("1", "true"):
+                self._epoch = CALENDAR_MAC_1904
+        return [(sheet.get("name"), relations[sheet.get(REL_ID_ATTR)]) for sheet in tree.iter(SHEET_TAG)]
+
+    def _read_styles(self):
+        """Index the cell styles holding date and timedelta number formats"""
+
+        self._date_formats = set()
+        self._date_styles = set()  # same as _date_formats, but as found in the s attribute
+        self._timedelta_formats = set()
+        try:
+            tree = fromstring(self._archive.read(self._styles_path))
+        except KeyError:
+            return
+        custom_formats = dict((int(numfmt.get("numFmtId")), numfmt.get("formatCode"))
+                              for numfmt in tree.iter(NUMFMT_TAG))
+        for cellxfs in tree.iter(CELLXFS_TAG):
+            for style_id, xf in enumerate(cellxfs.iter(XF_TAG)):
+                numfmt_id = int(xf.get("numFmtId", 0))
+                fmt = custom_formats.get(numfmt_id)
+                if fmt is None:
+                    fmt = builtin_format_code(numfmt_id)
+                if is_date_format(fmt):
+                    self._date_formats.add(style_id)
+                    self._date_styles.add(str(style_id))
+                if is_timedelta_format(fmt):
+                    self._timedelta_formats.add(style_id)
+
+    def _read_shared_strings(self):
+        """Resolve the shared strings table into a plain list once"""
+
+        try:
+            source = self._archive.open(self._shared_strings_path)
+        except KeyError:
+            self._shared_strings = []
+            return
+        strings = []
+        with source:
+            for _, element in iterparse(source):
+                if element.tag == STRING_ITEM_TAG:
+                    strings.append(_text_content(element).replace("x005F_", ""))
+                    element.clear()
+        self._shared_strings = strings
+
+    def _iter_rows(self):
+        """Yield rows padded the same way openpyxl's read-only iter_rows does"""
+
+        counter = 1
+        rows = self._iter_parsed_rows()
+        try:
+            for index, row in rows:
+                if self._max_row is not None and index > self._max_row:
+                    for _ in range(counter, self._max_row + 1):
+                        yield list(self._empty_row)
+                    break
+                # some rows are missing
+                for _ in range(counter, index):
+                    counter += 1
+                    yield list(self._empty_row)
+                if counter <= index:
+                    counter += 1
+                    yield row
+        finally:
+            rows.close()
+
+    def _iter_parsed_rows(self):
+        """Yield (row index, row) for every row element in the sheet XML"""
+
+        self._max_col = self._max_row = None
+        self._empty_row = []
+        index = 0
+        sheet_data = None
+        pending = None
+        source = self._archive.open(self._sheet_path)
+        try:
+            # Only start events are requested, a row is complete once the next one starts
+            for _, element in iterparse(source, events=("start",)):
+                tag = element.tag
+                if tag == ROW_TAG:
+                    if pending is not None:
+                        sheet_data.clear()
+                        index, row = self._parse_row(pending, index)
+                        yield index, row
+                    pending = element
+                elif tag == DIMENSION_TAG:
+                    boundaries = range_boundaries(element.get("ref"))
+                    if boundaries[2] is not None:
+                        self._max_col, self._max_row = boundaries[2], boundaries[3]
+                        self._empty_row = [self._empty] * (len(self._positions) if self._positions else self._max_col)
+                elif tag == DATA_TAG:
+                    sheet_data = element
+            if pending is not None:
+                yield self._parse_row(pending, index)
+        finally:
+            source.close()
+            self._archive.close()
+
+    def _parse_row(self, element, previous_index):
+        """Convert a row element into its index and a list of stringified values"""
+
+        index = element.get("r")
+        index = int(float(index)) if index is not None else previous_index + 1
+        if index < self._first_row:
+            return index, None
+        width = self._max_col
+        empty = self._empty
+        positions = self._positions
+        if positions is not None:
+            if not width and not len(element):
+                return index, []
+            row = [empty] * len(positions)
+        else:
+            row = [empty] * width if width else []
+        typed = self.typed
+        shared_strings = self._shared_strings
+        date_styles = self._date_styles
+        strip = self._strip
+        column = 0
+        for cell in element:
+            ref = cell.get("r")
+            if ref:
+                try:
+                    column = _column_indices[ref.rstrip(DIGITS)]
+                except KeyError:
+                    column = _column_index(ref)
+            else:
+                column += 1
+            if positions is not None:
+                position = positions.get(column)
+                if position is None:
+                    continue
+            else:
+                if width:
+                    if column > width:
+                        continue
+                elif column > len(row):
+                    row.extend([empty] * (column - len(row)))
+                position = column - 1
+            if not len(cell):
+                continue
+            # fast path for plain shared string, inline string and number cells
+            celltype = cell.get("t")
+            value = cell[0]
+            if len(cell) != 1:
+                value = self._cell_value(cell)
+            elif value.tag == VALUE_TAG and value.text and celltype in NUMBER_OR_SHARED_TYPES:
+                if celltype == "s":
+                    value = shared_strings[int(value.text)]
+                elif cell.get("s") not in date_styles:
+                    value = _cast_number(value.text) if typed else str(_cast_number(value.text))
+                else:
+                    value = self._cell_value(cell)
+            elif celltype == "inlineStr" and len(value) == 1 and value[0].tag == TEXT_TAG:
+                value = value[0].text or CLEAR_STRING
+            else:
+                value = self._cell_value(cell)
+            if strip is not None and (strip is True or column in strip) and isinstance(value, six_string_types):
+                value = value.strip()
+            row[position] = value
+        return index, row
+
+    def _cell_value(self, cell):
+        """Convert a cell the same way XLSXReader does on openpyxl cell objects"""
+
+        celltype = cell.get("t", "n")
+        if celltype == "inlineStr":
+            value = None
+        else:
+            value = cell.findtext(VALUE_TAG) or None
+
+        if cell.find(FORMULA_TAG) is not None:
+            return self._formula_parser.parse_formula(cell)
+        elif value is None:
+            if celltype == "inlineStr":
+                child = cell.find(INLINE_STRING_TAG)
+                if child is not None:
+                    return _text_content(child)
+            return self._empty
+        elif celltype == "n":
+            value = _cast_number(value)
+            style_id = int(cell.get("s", 0))
+            if style_id in self._date_formats:
+                try:
+                    value = from_excel(value, self._epoch, timedelta=style_id in self._timedelta_formats)
+                except (OverflowError, ValueError):
+                    return "#VALUE!"
+            if self.typed or not isinstance(value, (datetime, int, float)):
+                return value
+            return str(value)
+        elif celltype == "s":
+            return self._shared_strings[int(value)]
+        elif celltype == "b":
+            return bool(int(value))
+        elif celltype == "d":
+            value = from_ISO8601(value)
+            return str(value) if isinstance(value, datetime) and not self.typed else value
+        return value
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+    tablereader.bench
+    ~~~~~~~~~~~~~~~~~
+
+    Benchmarks for all backends and options
+
+    Generates synthetic files and reports rows per second and peak memory of every
+    reading path against a plain csv.DictReader baseline:
+
+        python -m tablereader.bench --rows 1000 10000 --columns 5 20 --json results.json
+
+    XLS files are only generated if xlwt is installed, pip install tablereader[bench]
+    brings it along. Otherwise the xls cases are reported as skipped, in the JSON
+    results as well. Peak memory is measured with tracemalloc in a separate run, so
+    it does not slow down the timing run.
+
+    :license: BSD-3
+"""
+
+#
+# Python imports
+from __future__ import print_function
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+#
+# environment imports
+import openpyxl
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+try:
+    import xlwt
+except ImportError:
+    xlwt = None
+
+#
+# local imports
+import tablereader
+
+#
+# constants
+HEADER_MARKER = "BEGIN_DATA"
+PREAMBLE_ROWS = 3
+XLS_MAX_ROWS = 65535  # below the header row
+XLS_MAX_COLUMNS = 256
+
+
+def _value(row, column, text):
+    kind = column % 4
+    if kind == 0:
+        return text % (row, column)
+    elif kind == 1:
+        return row * column
+    elif kind == 2:
+        return row * 0.25 + column
+    return datetime(2015, 12, 1) + timedelta(days=row % 1000)
+
+
+def generate_rows(rows, columns, text="text %d-%d"):
+    yield ["column%d" % column for column in range(columns)]
+    for row in range(rows):
+        yield [_value(row, column, text) for column in range(columns)]
+
+
+def write_csv(path, rows, columns, text="text %d-%d", preamble=False):
+    with io.open(path, "w", encoding="utf-8", newline="") as filehandle:
+        writer = csv.writer(filehandle, delimiter=";")
+        if preamble:
+            for number in range(PREAMBLE_ROWS):
+                writer.writerow(["preamble line %d" % number])
+        for number, row in enumerate(generate_rows(rows, columns, text)):
+            if preamble and number == 0:
+                row[0] = HEADER_MARKER
+            writer.writerow([str(value) for value in row])
+
+
+def write_xlsx(path, rows, columns):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Data")
+    for row in generate_rows(rows, columns):
+        sheet.append(row)
+    workbook.save(path)
+
+
+def write_xls(path, rows, columns):
+    workbook = xlwt.Workbook()
+    sheet = workbook.add_sheet("Data")
+    date_style = xlwt.easyxf(num_format_str="YYYY-MM-DD")
+    for rowx, row in enumerate(generate_rows(rows, columns)):
+        for colx, value in enumerate(row):
+            if isinstance(value, datetime):
+                sheet.write(rowx, colx, value, date_style)
+            else:
+                sheet.write(rowx, colx, value)
+    workbook.save(path)
+
+
+def _count(reader):
+    count = 0
+    try:
+        for _ in reader:
+            count += 1
+    finally:
+        reader.close()
+    return count
+
+
+def _count_batches(reader):
+    count = 0
+    try:
+        for batch in reader.iter_batches(1000):
+            count += len(next(iter(batch.values())))
+    finally:
+        reader.close()
+    return count
+
+
+def benchmark_cases(files):
+    """Yield (name, filename, function returning the number of rows read), filename is None for files not generated"""
+
+    csv_file, unicode_file, offset_file, xlsx_file, xls_file = files
+
+    def dictreader(filename):
+        with io.open(filename, encoding="utf-8", newline="") as filehandle:
+            return sum(1 for _ in csv.DictReader(filehandle, delimiter=";"))
+
+    yield "baseline csv.DictReader", csv_file, dictreader
+    yield "csv", csv_file, lambda filename: _count(tablereader.TableReader(filename))
+    yield "csv strip_whitespaces", csv_file, lambda filename: _count(tablereader.TableReader(filename, strip_whitespaces=True))
+    yield "csv iter_batches", csv_file, lambda filename: _count_batches(tablereader.TableReader(filename))
+    yield "csv use_mmap", csv_file, lambda filename: _count(tablereader.TableReader(filename, use_mmap=True))
+    yield "csv workers=2", csv_file, lambda filename: _count(tablereader.TableReader(filename, workers=2))
+    yield "unicodecsv", unicode_file, lambda filename: _count(tablereader.TableReader(filename, force_type="unicodecsv"))
+    yield "unicodecsv strip_whitespaces", unicode_file, lambda filename: _count(
+        tablereader.TableReader(filename, force_type="unicodecsv", strip_whitespaces=True))
+    yield "csv OffsetTableReader", offset_file, lambda filename: _count(tablereader.OffsetTableReader(filename, HEADER_MARKER))
+    yield "xlsx", xlsx_file, lambda filename: _count(tablereader.TableReader(filename))
+    yield "xlsx strip_whitespaces", xlsx_file, lambda filename: _count(tablereader.TableReader(filename, strip_whitespaces=True))
+    yield "xlsx typed", xlsx_file, lambda filename: _count(tablereader.TableReader(filename, typed=True))
+    yield "xlsx-fast", xlsx_file, lambda filename: _count(tablereader.TableReader(filename, force_type="xlsx-fast"))
+    yield "xlsx-fast iter_batches", xlsx_file, lambda filename: _count_batches(
+        tablereader.TableReader(filename, force_type="xlsx-fast"))
+    yield "xls", xls_file, lambda filename: _count(tablereader.TableReader(filename))
+    yield "xls strip_whitespaces", xls_file, lambda filename: _count(tablereader.TableReader(filename, strip_whitespaces=True))
+    yield "xls typed", xls_file, lambda filename: _count(tablereader.TableReader(filename, typed=True))
+    yield "xls iter_batches", xls_file, lambda filename: _count_batches(tablereader.TableReader(filename))
+
+
+def xls_skip_reason(rows, columns):
+    """Why no xls file of this size is generated, None if it is"""
+
+    if xlwt is None:
+        return "xlwt is not installed, pip install tablereader[bench]"
+    if rows > XLS_MAX_ROWS or columns > XLS_MAX_COLUMNS:
+        return "xls holds at most %d rows and %d columns" % (XLS_MAX_ROWS, XLS_MAX_COLUMNS)
+    return None
+
+
+def measure(function, filename, repeat):
+    """Best wall time of repeat runs and the peak traced memory of one more run
+
+    Workbooks shared between readers are dropped before each run, so every run opens its file.
+    """
+
+    best = None
+    for _ in range(repeat):
+        tablereader.workbook_cache.invalidate()
+        start = time.time()
+        count = function(filename)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    peak = None
+    if tracemalloc is not None:
+        tablereader.workbook_cache.invalidate()
+        tracemalloc.start()
+        try:
+            function(filename)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return count, best, peak
+
+
+def run(row_counts, column_counts, repeat, selected=None, out=sys.stdout):
+    results = []
+    directory = tempfile.mkdtemp(prefix="tablereader-bench-")
+    try:
+        for rows in row_counts:
+            for columns in column_counts:
+                prefix = os.path.join(directory, "%d_%d" % (rows, columns))
+                files = [prefix + ".csv", prefix + "_unicode.csv", prefix + "_offset.csv", prefix + ".xlsx", None]
+                write_csv(files[0], rows, columns)
+                write_csv(files[1], rows, columns, text=u"téxt üß€ %d-%d")
+                write_csv(files[2], rows, columns, preamble=True)
+                write_xlsx(files[3], rows, columns)
+                xls_skipped = xls_skip_reason(rows, columns)
+                if xls_skipped is None:
+                    files[4] = prefix + ".xls"
+                    write_xls(files[4], rows, columns)
+
+                baseline = None
+                for name, filename, function in benchmark_cases(files):
+                    if selected and name not in selected and not name.startswith("baseline"):
+                        continue
+                    result = {"case": name, "rows": rows, "columns": columns}
+                    results.append(result)
+                    if filename is None:
+                        result["skipped"] = xls_skipped
+                        print("%-32s %8d x %-4d skipped: %s" % (name, rows, columns, xls_skipped), file=out)
+                        continue
+                    try:
+                        count, seconds, peak = measure(function, filename, repeat)
+                    except Exception as error:
+                        result["error"] = "%s: %s" % (error.__class__.__name__, error)
+                        print("%-32s %8d x %-4d failed: %s" % (name, rows, columns, result["error"]), file=out)
+                        continue
+                    rows_per_sec = count / seconds if seconds else None
+                    if baseline is None:
+                        baseline = rows_per_sec
+                    result.update({
+                        "rows_read": count,
+                        "seconds": seconds,
+                        "rows_per_sec": rows_per_sec,
+                        "relative_to_baseline": rows_per_sec / baseline if rows_per_sec and baseline else None,
+                        "peak_memory_bytes": peak,
+                    })
+                    print("%-32s %8d x %-4d %12.0f rows/s %7.2fx %10s KiB" % (
+                        name, rows, columns, rows_per_sec or 0, result["relative_to_baseline"] or 0,
+                        "-" if peak is None else peak // 1024), file=out)
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tablereader.bench", description=__doc__.split("\n\n")[1].strip())
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 20000], help="row counts of generated files")
+    parser.add_argument("--columns", type=int, nargs="+", default=[5, 25], help="column counts of generated files")
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per case, the best one is reported")
+    parser.add_argument("--case", action="append", dest="cases", help="only run the given case, may be repeated")
+    parser.add_argument("--json", dest="json_path", help="write machine-readable results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args.rows, args.columns, args.repeat, args.cases)
+    if args.json_path:
+        with open(args.json_path, "w") as filehandle:
+            json.dump({
+                "tablereader": tablereader.__version__,
+                "python": platform.python_implementation() + " " + platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            }, filehandle, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
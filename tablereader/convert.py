@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+    tablereader.convert
+    ~~~~~~~~~~~~~~~~~~~
+
+    Convert xls, xlsx and CSV files to CSV or xlsx
+
+    Rows are streamed batch by batch from TableReader to TableWriter, so memory
+    stays flat. Files and sheets are converted on a pool of worker processes,
+    each importing the spreadsheet libraries only once:
+
+        python -m tablereader convert exports/*.xlsx --all-sheets -o converted --workers 4
+
+    :license: BSD-3
+"""
+
+#
+# Python imports
+from __future__ import print_function
+import argparse
+import glob
+import multiprocessing
+import os
+import re
+import sys
+
+#
+# local imports
+import tablereader
+
+#
+# constants
+OUTPUT_EXTENSIONS = {"csv": ".csv", "unicodecsv": ".csv", "xlsx": ".xlsx"}
+SPREADSHEET_EXTENSIONS = (".xls", ".xlsx", ".xlsm", ".xltx", ".xltm")
+
+
+def expand_inputs(patterns):
+    """Filenames matching patterns, in order and without duplicates. Patterns matching nothing are kept as they are"""
+
+    filenames = []
+    for pattern in patterns:
+        for filename in sorted(glob.glob(pattern)) or [pattern]:
+            if filename not in filenames:
+                filenames.append(filename)
+    return filenames
+
+
+def _is_spreadsheet(filename, input_type):
+    if input_type:
+        return input_type.lower() in ("xls", "xlsx", "xlsx-fast")
+    return os.path.splitext(filename)[1].lower() in SPREADSHEET_EXTENSIONS
+
+
+def _output_path(filename, sheet, per_sheet, output_dir, output_type):
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    if per_sheet:
+        stem += "_" + re.sub(r"[^\w.-]+", "_", sheet)
+    return os.path.join(output_dir or os.path.dirname(filename), stem + OUTPUT_EXTENSIONS[output_type])
+
+
+def build_jobs(filenames, args):
+    """(input, sheet, output, options) per file or sheet to convert"""
+
+    jobs = []
+    outputs = {}
+    for filename in filenames:
+        sheets = [None]
+        per_sheet = False
+        if _is_spreadsheet(filename, args.input_type):
+            if args.all_sheets:
+                sheets = tablereader.TableReader.get_sheet_names(filename)
+            elif args.sheets:
+                sheets = args.sheets
+            per_sheet = args.all_sheets or len(sheets) > 1
+        for sheet in sheets:
+            output = _output_path(filename, sheet, per_sheet, args.output_dir, args.to)
+            if os.path.abspath(output) == os.path.abspath(filename):
+                raise ValueError("%s would be overwritten by its own conversion, give an output directory" % filename)
+            if output in outputs:
+                raise ValueError("%s and %s would both be converted to %s" % (outputs[output], filename, output))
+            outputs[output] = filename
+            jobs.append((filename, sheet, output, vars(args)))
+    return jobs
+
+
+def convert_job(job):
+    """Convert one file or sheet, module level so multiprocessing can pickle it
+
+    Returns input, sheet, output, number of rows and an error message or None.
+    """
+
+    filename, sheet, output, options = job
+    reader_kwargs = {
+        "sheet": sheet,
+        "force_type": options["input_type"],
+        "strip_whitespaces": options["strip_whitespaces"],
+    }
+    if not _is_spreadsheet(filename, options["input_type"]):
+        reader_kwargs.update(delimiter=options["delimiter"], quotechar=options["quotechar"], encoding=options["encoding"])
+    try:
+        if options["header_marker"] is not None:
+            reader = tablereader.OffsetTableReader(filename, options["header_marker"], header_scan_rows=options["header_scan_rows"],
+                                                   **reader_kwargs)
+        else:
+            reader = tablereader.TableReader(filename, **reader_kwargs)
+        try:
+            fieldnames = reader.fieldnames or []
+            with tablereader.TableWriter(output, fieldnames=fieldnames, force_type=options["to"], write_header=bool(fieldnames),
+                                         delimiter=options["output_delimiter"], encoding=options["output_encoding"]) as writer:
+                for batch in reader.iter_batches(options["batch_size"]):
+                    writer.write_batch(batch)
+        finally:
+            reader.close()
+    except Exception as error:
+        return filename, sheet, output, 0, "%s: %s" % (error.__class__.__name__, error)
+    return filename, sheet, output, writer.line_num - writer.write_header, None
+
+
+def run(jobs, workers=None, out=None):
+    """Convert jobs on workers processes, reporting each one as it finishes. Returns the number of failed jobs"""
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(jobs))
+    out = out or sys.stdout
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(convert_job, jobs, chunksize=1)
+    else:
+        results = (convert_job(job) for job in jobs)
+    failed = 0
+    try:
+        for filename, sheet, output, rows, error in results:
+            source = filename if sheet is None else "%s [%s]" % (filename, sheet)
+            if error is None:
+                print("%s -> %s (%d rows)" % (source, output, rows), file=out)
+            else:
+                failed += 1
+                print("%s failed: %s" % (source, error), file=out)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return failed
+
+
+def add_arguments(parser):
+    parser.add_argument("inputs", nargs="+", metavar="input", help="files or glob patterns to convert")
+    parser.add_argument("-o", "--output-dir", help="directory to write to, defaults to the directory of each input")
+    parser.add_argument("-t", "--to", choices=sorted(OUTPUT_EXTENSIONS), default="csv", help="output format")
+    parser.add_argument("-w", "--workers", type=int, help="worker processes, defaults to the number of CPUs")
+    parser.add_argument("-s", "--sheet", action="append", dest="sheets", metavar="SHEET", help="sheet to convert, may be repeated")
+    parser.add_argument("--all-sheets", action="store_true", help="convert every sheet into a file of its own")
+    parser.add_argument("--header-marker", help="cell content marking the header row, read through OffsetTableReader")
+    parser.add_argument("--header-scan-rows", type=int, help="give up if the header marker is not within this many rows")
+    parser.add_argument("--input-type", help="force the input format, see TableReader's force_type")
+    parser.add_argument("--delimiter", default=";", help="CSV input delimiter, empty to guess it")
+    parser.add_argument("--quotechar", default='"', help="CSV input quote character, empty to guess it")
+    parser.add_argument("--encoding", help="CSV input encoding, \"auto\" to detect it")
+    parser.add_argument("--output-delimiter", default=";", help="CSV output delimiter")
+    parser.add_argument("--output-encoding", help="CSV output encoding")
+    parser.add_argument("--strip-whitespaces", action="store_true", help="strip whitespace off all cells")
+    parser.add_argument("--batch-size", type=int, default=10000, help="rows passed from reader to writer at once")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tablereader convert", description=__doc__.split("\n\n")[1].strip())
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    args.delimiter = args.delimiter or None
+    args.quotechar = args.quotechar or None
+
+    filenames = expand_inputs(args.inputs)
+    if args.output_dir and not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    try:
+        jobs = build_jobs(filenames, args)
+    except (IOError, OSError, ValueError, NotImplementedError) as error:
+        parser.error(str(error))
+    return 1 if run(jobs, args.workers) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,17 +11,32 @@
 
 #
 # python imports
+import argparse
 from collections import OrderedDict
+from datetime import datetime
+import gc
+import io
+import mmap
 import unittest
 import os.path
 from os.path import join as pjoin
+import pickle
+import shutil
+import tempfile
 
 #
 # environment imports
+import openpyxl
+from six import PY2
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 #
 # local imports
 import tablereader
+from tablereader import _columns, _csv_from_pypy
 
 #
 # constants
@@ -109,3 +124,802 @@ class TablereaderTestCase(unittest.TestCase):
         ]
         actual_data = [row for row in reader]
         self.assertEqual(expected_result, actual_data)
+
+    def test_iter_batches(self):
+        for filename, kwargs in (("test_simple.xlsx", {}),
+                                 ("test_simple.xls", {}),
+                                 ("test_simple_german.csv", {}),
+                                 ("test_simple_german.csv", {"force_type": "unicodecsv"})):
+            reader = tablereader.TableReader(pjoin(self.samplefiles_directory, filename), **kwargs)
+            expected_rows = [row for row in reader]
+            reader = tablereader.TableReader(pjoin(self.samplefiles_directory, filename), **kwargs)
+            batches = list(reader.iter_batches(1))
+            self.assertEqual(len(batches), 2)
+            self.assertEqual(reader.line_num, 3)
+            actual_rows = [dict((name, batch[name][0]) for name in reader.fieldnames) for batch in batches]
+            self.assertEqual(expected_rows, actual_rows)
+
+    def test_scanning_reader_matches_reader(self):
+        lines = ['plain;fields;here\n', '"quoted";"with ; delimiter";"doubled "" quote"\n', '\n',
+                 'mid"quote;"open\n', 'field";after\n', '"trailing"junk;x\r\n', 'last;']
+        for kwargs in ({"delimiter": ";"}, {"delimiter": ";", "doublequote": False}, {"delimiter": ";", "escapechar": "\\"}):
+            expected = [(row, reader.line_num) for reader in [_csv_from_pypy.Reader(lines, **kwargs)] for row in reader]
+            actual = [(row, reader.line_num) for reader in [_csv_from_pypy.ScanningReader(lines, **kwargs)] for row in reader]
+            self.assertEqual(expected, actual)
+
+    def test_xls_sheet_unloaded_after_iteration(self):
+        reader = tablereader.XLReader(pjoin(self.samplefiles_directory, "test_simple.xls"))
+        self.assertTrue(reader._reader.sheet_loaded(0))
+        rows = [row for row in reader]
+        self.assertEqual(rows[1], ['Beispiel', '12345.0', '2.35', '0.125'])
+        self.assertEqual(reader.line_num, 3)
+        self.assertFalse(reader._reader.sheet_loaded(0))
+
+    def test_xlsx_fast_matches_xlsx(self):
+        filename = pjoin(self.samplefiles_directory, "test_simple.xlsx")
+        expected_result = [row for row in tablereader.TableReader(filename)]
+        actual_data = [row for row in tablereader.TableReader(filename, force_type="xlsx-fast")]
+        self.assertEqual(expected_result, actual_data)
+        self.assertRaises(ValueError, tablereader.TableReader, filename, sheet="Missing", force_type="xlsx-fast")
+
+    def test_read_sheets(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = pjoin(directory, "sheets.xlsx")
+        workbook = openpyxl.Workbook()
+        workbook.active.title = "First"
+        workbook.active.append(["Name", "Value"])
+        workbook.active.append(["a", "1"])
+        second = workbook.create_sheet("Second")
+        second.append(["Name", "Value"])
+        second.append(["b", "2"])
+        workbook.save(filename)
+
+        result = tablereader.TableReader.read_sheets(filename, workers=2)
+        self.assertEqual(list(result), ["First", "Second"])
+        self.assertEqual(result["First"], [{"Name": "a", "Value": "1"}])
+        self.assertEqual(result["Second"], [{"Name": "b", "Value": "2"}])
+        result = tablereader.TableReader.read_sheets(filename, workers=2, row_type="tuple")
+        self.assertEqual(result["First"], [("a", "1")])
+        self.assertEqual(result["Second"][0]["Name"], "b")
+        result = tablereader.TableReader.read_sheets(filename, sheets=["Second"], batch_size=10)
+        self.assertEqual(result, OrderedDict([("Second", [{"Name": ["b"], "Value": ["2"]}])]))
+
+    def test_parallel_csv(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = pjoin(directory, "parallel.csv")
+        with open(filename, "w") as filehandle:
+            filehandle.write("Name;Text\n")
+            for number in range(200):
+                filehandle.write('row%d;"multi\nline ""%d"" ; text"\n' % (number, number))
+
+        def read(**kwargs):
+            reader = tablereader.TableReader(filename, **kwargs)
+            return [(row, reader.line_num) for row in reader]
+
+        expected_result = read()
+        self.addCleanup(setattr, tablereader.ParallelCSVReader, "chunk_size", tablereader.ParallelCSVReader.chunk_size)
+        tablereader.ParallelCSVReader.chunk_size = 500
+        self.assertEqual(expected_result, read(workers=2))
+        self.assertEqual(expected_result, read(workers=2, force_type="unicodecsv"))
+        actual_data = read(workers=2, ordered=False)
+        self.assertEqual(expected_result[0], actual_data[0])
+        self.assertEqual(sorted(expected_result, key=lambda entry: entry[1]), sorted(actual_data, key=lambda entry: entry[1]))
+
+        with open(filename, "w") as filehandle:  # a stray quote must not move chunk boundaries into quoted fields
+            filehandle.write('Name;Text\n1;5" screen\n')
+            for number in range(40):
+                filehandle.write('row%d;"multi\nline"\n' % number)
+        expected_result = read()
+        self.assertEqual(len(expected_result), 41)
+        tablereader.ParallelCSVReader.chunk_size = 30
+        self.assertEqual(expected_result, read(workers=2))
+        self.assertEqual(expected_result, read(workers=3, force_type="unicodecsv"))
+        self.assertEqual(sorted(expected_result, key=lambda entry: entry[1]),
+                         sorted(read(workers=3, ordered=False), key=lambda entry: entry[1]))
+
+    def test_mmap_csv(self):
+        for filename, kwargs in (("test_simple_german.csv", {}),
+                                 ("test_simple_usenglish.csv", {"quotechar": "'", "delimiter": ","})):
+            filename = pjoin(self.samplefiles_directory, filename)
+            expected_result = [row for row in tablereader.TableReader(filename, **kwargs)]
+            reader = tablereader.TableReader(filename, use_mmap=True, **kwargs)
+            self.assertEqual(expected_result, [row for row in reader])
+            self.assertEqual(reader.line_num, 3)
+            reader.close()
+
+        content = 'plain;"quoted ; field"\r\n"multi\nline";x\n\nescaped "" quote;"doubled "" quote"'
+        reader = _csv_from_pypy.ScanningReader(content.splitlines(True), delimiter=";")
+        expected_result = [(row, reader.line_num) for row in reader]
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = pjoin(directory, "mapped.csv")
+        with open(filename, "wb") as filehandle:
+            filehandle.write(content.encode("utf-8"))
+        reader = tablereader.MMapCSVReader(filename, encoding="utf-8")
+        self.assertEqual(expected_result, [(row, reader.line_num) for row in reader])
+        reader.close()
+
+        # records, multi-byte characters and \r\n line breaks cut in half by window boundaries
+        filename = pjoin(directory, "windows.csv")
+        with io.open(filename, "w", encoding="utf-8", newline="") as filehandle:
+            filehandle.write(u"".join(u'%d;"\u20ac %s\r\nzwei";x\r\n' % (index, "y" * (index % 7)) for index in range(3000)))
+        with io.open(filename, encoding="utf-8") as filehandle:
+            expected_result = [row for row in _csv_from_pypy.reader(filehandle, delimiter=";")]
+        self.assertEqual(len(expected_result), 3000)
+        for kind in ("csv", "unicodecsv"):
+            reader = tablereader.MMapCSVReader(filename, "utf-8", kind=kind, window_size=mmap.ALLOCATIONGRANULARITY)
+            self.assertEqual(expected_result, [row for row in reader])
+            self.assertEqual(reader.line_num, 6000)
+            reader.close()
+
+    def test_typed(self):
+        expected_result = [{'Name': 'Beispiel', 'Artikelnummer': 12345, 'Preis': 2.35, 'Gewicht': 0.125},
+                           {'Name': 'Beispiel2', 'Artikelnummer': 23456, 'Preis': 2.48, 'Gewicht': 2.5}]
+        for filename, kwargs in (("test_simple.xls", {}),
+                                 ("test_simple.xlsx", {}),
+                                 ("test_simple.xlsx", {"force_type": "xlsx-fast"})):
+            reader = tablereader.TableReader(pjoin(self.samplefiles_directory, filename), typed=True, **kwargs)
+            actual_data = [row for row in reader]
+            self.assertEqual(expected_result, actual_data)
+            self.assertEqual([type(value) for value in actual_data[0].values()], [str, int, float, float])
+
+        schema = {'Artikelnummer': int, 'Preis': tablereader.decimal_comma, 'Gewicht': tablereader.decimal_comma}
+        reader = tablereader.TableReader(pjoin(self.samplefiles_directory, "test_simple_german.csv"), schema=schema)
+        self.assertEqual(expected_result, [row for row in reader])
+        reader = tablereader.TableReader(pjoin(self.samplefiles_directory, "test_simple_german.csv"), schema=schema)
+        self.assertEqual(list(reader.iter_batches())[0]['Preis'], [2.35, 2.48])
+        self.assertEqual(tablereader.decimal_comma("1.234,5"), 1234.5)
+
+    def test_sheet_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cache = tablereader.SheetCache(directory)
+        for filename in ("test_simple.xls", "test_simple.xlsx"):
+            filename = pjoin(self.samplefiles_directory, filename)
+            expected_result = [row for row in tablereader.TableReader(filename)]
+            self.assertEqual(expected_result, [row for row in tablereader.TableReader(filename, cache=cache)])
+            reader = tablereader.TableReader(filename, cache=cache)
+            self.assertIsInstance(reader.reader.reader, tablereader.CachedSheetReader)
+            self.assertEqual(expected_result, [row for row in reader])
+            self.assertEqual(reader.line_num, 3)
+        self.assertEqual(len(os.listdir(directory)), 2)
+
+        cache.max_size = 0
+        cache.evict()
+        self.assertEqual(os.listdir(directory), [])
+
+    def test_tuple_rows(self):
+        for filename, kwargs in (("test_simple.xls", {}),
+                                 ("test_simple.xlsx", {"typed": True}),
+                                 ("test_simple_german.csv", {"schema": {"Preis": tablereader.decimal_comma}})):
+            filename = pjoin(self.samplefiles_directory, filename)
+            expected_result = [row for row in tablereader.TableReader(filename, **kwargs)]
+            reader = tablereader.TableReader(filename, row_type="tuple", **kwargs)
+            actual_data = [row for row in reader]
+            self.assertEqual(reader.line_num, 3)
+            self.assertEqual(expected_result, [dict(row.items()) for row in actual_data])
+            self.assertIsInstance(actual_data[0], tuple)
+            self.assertIs(type(actual_data[0]), type(actual_data[1]))
+            self.assertEqual(actual_data[0]['Name'], 'Beispiel')
+            self.assertEqual(actual_data[0][0], 'Beispiel')
+            self.assertEqual(actual_data[0].get('Missing', 'default'), 'default')
+            self.assertRaises(KeyError, lambda: actual_data[0]['Missing'])
+            self.assertIn('Name', actual_data[0])
+            self.assertNotIn('Beispiel', actual_data[0])
+            self.assertEqual(actual_data[0][:1], ('Beispiel',))
+            copied = pickle.loads(pickle.dumps(actual_data[0], pickle.HIGHEST_PROTOCOL))
+            self.assertIs(type(copied), type(actual_data[0]))
+            self.assertEqual(copied, actual_data[0])
+            self.assertEqual(copied['Name'], 'Beispiel')
+        self.assertRaises(ValueError, tablereader.TableReader, filename, row_type="list")
+
+    def test_columns(self):
+        csv_file = pjoin(self.samplefiles_directory, "test_simple_german.csv")
+        for filename, kwargs in (("test_simple.xls", {}),
+                                 ("test_simple.xlsx", {}),
+                                 ("test_simple.xlsx", {"force_type": "xlsx-fast"}),
+                                 ("test_simple_german.csv", {}),
+                                 ("test_simple_german.csv", {"force_type": "unicodecsv"}),
+                                 ("test_simple_german.csv", {"use_mmap": True}),
+                                 ("test_simple_german.csv", {"row_type": "tuple"})):
+            filename = pjoin(self.samplefiles_directory, filename)
+            expected_result = [dict((name, row[name]) for name in ("Preis", "Name"))
+                               for row in tablereader.TableReader(filename, **kwargs)]
+            reader = tablereader.TableReader(filename, columns=["Preis", "Name"], **kwargs)
+            self.assertEqual(reader.fieldnames, ["Preis", "Name"])
+            actual_data = [dict(row.items()) for row in reader]
+            self.assertEqual(expected_result, actual_data)
+            self.assertEqual(reader.line_num, 3)
+        self.assertRaises(ValueError, tablereader.TableReader, csv_file, columns=["Missing"])
+
+        directory = tempfile.mkdtemp()
+        try:
+            filename = pjoin(directory, "offset.csv")
+            with open(filename, "w") as filehandle:
+                filehandle.write("preamble\nBEGIN;a;b;c\n;1;2;3\n;4\n")
+            reader = tablereader.OffsetTableReader(filename, "BEGIN", force_type="unicodecsv", columns=["c", "a"])
+            self.assertEqual([dict(row) for row in reader], [{"c": "3", "a": "1"}, {"c": None, "a": "4"}])
+
+            filename = pjoin(directory, "multiline.csv")
+            with open(filename, "w") as filehandle:
+                filehandle.write('a;b;c\n1;"multi\nline";3\n4;5;6\n')
+            for kwargs in ({"force_type": "unicodecsv"}, {"force_type": "unicodecsv", "use_mmap": True}):
+                reader = tablereader.TableReader(filename, delimiter=";", columns=["a"], **kwargs)
+                self.assertEqual([dict(row) for row in reader], [{"a": "1"}, {"a": "4"}])
+                self.assertEqual(reader.line_num, 4)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_strip_whitespaces(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        rows = [[" Name ", "Text"], [" Beispiel ", " a "], ["Beispiel2\t", "b "]]
+        csv_file = pjoin(directory, "padded.csv")
+        with open(csv_file, "w") as filehandle:
+            filehandle.write("\n".join(";".join(row) for row in rows) + "\n")
+        xlsx_file = pjoin(directory, "padded.xlsx")
+        workbook = openpyxl.Workbook()
+        for row in rows:
+            workbook.active.append(row)
+        workbook.save(xlsx_file)
+
+        all_stripped = [{"Name": "Beispiel", "Text": "a"}, {"Name": "Beispiel2", "Text": "b"}]
+        name_stripped = [{" Name ": "Beispiel", "Text": " a "}, {" Name ": "Beispiel2", "Text": "b "}]
+        for filename, kwargs in ((xlsx_file, {}),
+                                 (xlsx_file, {"force_type": "xlsx-fast"}),
+                                 (xlsx_file, {"cache": pjoin(directory, "cache")}),
+                                 (xlsx_file, {"cache": pjoin(directory, "cache")}),
+                                 (xlsx_file, {"columns": ["Text"]}),
+                                 (csv_file, {}),
+                                 (csv_file, {"force_type": "unicodecsv"}),
+                                 (csv_file, {"use_mmap": True}),
+                                 (csv_file, {"workers": 2}),
+                                 (csv_file, {"row_type": "tuple"})):
+            columns = kwargs.get("columns")
+            reader = tablereader.TableReader(filename, strip_whitespaces=True, **kwargs)
+            expected_result = [dict((name, row[name]) for name in columns or row) for row in all_stripped]
+            self.assertEqual([dict(row.items()) for row in reader], expected_result)
+            reader.close()
+            reader = tablereader.TableReader(filename, strip_whitespaces=[" Name "], **kwargs)
+            expected_result = [dict((name, row[name]) for name in columns or row) for row in name_stripped]
+            self.assertEqual([dict(row.items()) for row in reader], expected_result)
+            reader.close()
+        self.assertRaises(ValueError, tablereader.TableReader, csv_file, strip_whitespaces=["Name"])
+        reader = tablereader.OffsetTableReader(csv_file, "Beispiel", strip_whitespaces=True)
+        self.assertEqual([dict(row) for row in reader], [{"Beispiel": "Beispiel2", "a": "b"}])
+        reader = tablereader.OffsetTableReader(csv_file, " Name ", strip_whitespaces=["Text"])
+        self.assertEqual([dict(row) for row in reader], [{" Name ": " Beispiel ", "Text": "a"}, {" Name ": "Beispiel2\t", "Text": "b"}])
+
+        filename = pjoin(self.samplefiles_directory, "test_simple.xls")
+        self.assertEqual(list(tablereader.TableReader(filename, strip_whitespaces=True)), list(tablereader.TableReader(filename)))
+        self.assertEqual(list(tablereader.TableReader(filename, strip_whitespaces=["Name"])), list(tablereader.TableReader(filename)))
+
+    def test_encoding(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        content = u'Name;Text\nM\xfcller;"zwei\nZeilen \u20ac"\nStra\xdfe;x\n'
+        expected_result = [{"Name": u"M\xfcller", "Text": u"zwei\nZeilen \u20ac"}, {"Name": u"Stra\xdfe", "Text": "x"}]
+        for encoding, detected in (("cp1252", "cp1252"), ("utf-8", "utf-8"), ("utf-8-sig", "utf-8-sig"),
+                                   ("utf-16", "utf-16"), ("utf-32", "utf-32")):
+            filename = pjoin(directory, encoding + ".csv")
+            with open(filename, "wb") as filehandle:
+                filehandle.write(content.encode(encoding))
+            kwargs_list = [{}, {"force_type": "unicodecsv"}, {"delimiter": None}, {"force_type": "unicodecsv", "delimiter": None},
+                           {"use_mmap": True}]
+            if not encoding.startswith("utf-16") and not encoding.startswith("utf-32"):
+                kwargs_list.extend([{"workers": 2}, {"resumable": True}])
+            for kwargs in kwargs_list:
+                reader = tablereader.TableReader(filename, encoding="auto", **kwargs)
+                self.assertEqual(reader.encoding, detected)
+                self.assertEqual([dict(row) for row in reader], expected_result, (encoding, kwargs))
+                self.assertEqual(reader.line_num, 4)
+                reader.close()
+            reader = tablereader.TableReader(filename, encoding=encoding, force_type="unicodecsv")
+            self.assertEqual([dict(row) for row in reader][1:], expected_result[1:])
+            reader.close()
+
+        content = content.replace("\n", "\r\n") + "no line break\rat the end"
+        for chunk_size in (1, 2, 3, 7):
+            filehandle = tempfile.TemporaryFile()
+            self.addCleanup(filehandle.close)
+            filehandle.write(content.encode("utf-8"))
+            filehandle.seek(0)
+            self.assertEqual(list(tablereader._decoded_lines(filehandle, "utf-8", chunk_size)),
+                             io.StringIO(content, newline=None).readlines())
+
+    def test_table_writer(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source = pjoin(self.samplefiles_directory, "test_simple.xlsx")
+        expected_result = list(tablereader.TableReader(source))
+        fieldnames = ["Name", "Artikelnummer", "Preis", "Gewicht"]
+        for name, kwargs in (("rows.csv", {}), ("rows.txt", {"force_type": "unicodecsv"}), ("rows.xlsx", {})):
+            filename = pjoin(directory, name)
+            with tablereader.TableWriter(filename, **kwargs) as writer:
+                writer.writerow(expected_result[0])
+                writer.writerows(expected_result[1:])
+            self.assertEqual(writer.line_num, 3)
+            read_kwargs = {"force_type": "csv"} if name.endswith(".txt") else {}
+            self.assertEqual(list(tablereader.TableReader(filename, **read_kwargs)), expected_result)
+
+            with tablereader.TableWriter(filename, fieldnames=fieldnames[::-1], **kwargs) as writer:
+                for batch in tablereader.TableReader(source).iter_batches(1):
+                    writer.write_batch(batch)
+            reader = tablereader.TableReader(filename, **read_kwargs)
+            self.assertEqual(reader.fieldnames, fieldnames[::-1])
+            self.assertEqual(list(reader), expected_result)
+
+        output = io.StringIO()
+        writer = tablereader.TableWriter(output, ["a", "b"], force_type="unicodecsv", delimiter=",", lineterminator="\n")
+        writer.writerows([("x;y", 'say "hi"'), ("multi\nline", None), {"b": 1.5}])
+        writer.close()
+        self.assertEqual(output.getvalue(), 'a,b\nx;y,"say ""hi"""\n"multi\nline",\n,1.5\n')
+        self.assertRaises(ValueError, writer.writerow, ("late", "row"))
+        self.assertRaises(NotImplementedError, tablereader.TableWriter, pjoin(directory, "rows.xls"))
+
+    def test_convert(self):
+        from tablereader import convert
+
+        def run(arguments, workers=1):
+            parser = argparse.ArgumentParser()
+            convert.add_arguments(parser)
+            args = parser.parse_args(arguments + ["-o", output_dir])
+            out = io.StringIO()
+            failed = convert.run(convert.build_jobs(convert.expand_inputs(args.inputs), args), workers, out)
+            return failed, out.getvalue()
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output_dir = pjoin(directory, "out")
+        os.mkdir(output_dir)
+        for name in ("test_simple.xls", "test_simple_german.csv"):
+            shutil.copy(pjoin(self.samplefiles_directory, name), directory)
+        with open(pjoin(directory, "offset.csv"), "w") as filehandle:
+            filehandle.write("exported today\nBEGIN;a\n1;2\n")
+
+        for workers in (1, 2):
+            failed, output = run([pjoin(directory, "*.xls"), pjoin(directory, "*german.csv"), "--all-sheets", "-t", "xlsx"], workers)
+            self.assertEqual(failed, 0)
+            self.assertEqual(output.count("(2 rows)"), 2)
+            self.assertEqual(sorted(os.listdir(output_dir)), ["test_simple_Blatt1.xlsx", "test_simple_german.xlsx"])
+            self.assertEqual(list(tablereader.TableReader(pjoin(output_dir, "test_simple_Blatt1.xlsx"))),
+                             list(tablereader.TableReader(pjoin(self.samplefiles_directory, "test_simple.xls"))))
+            for name in os.listdir(output_dir):
+                os.remove(pjoin(output_dir, name))
+
+        self.assertEqual(run([pjoin(directory, "offset.csv"), "--header-marker", "BEGIN"])[0], 0)
+        self.assertEqual(list(tablereader.TableReader(pjoin(output_dir, "offset.csv"))), [{"BEGIN": "1", "a": "2"}])
+        failed, output = run([pjoin(directory, "missing.csv")])
+        self.assertEqual(failed, 1)
+        self.assertIn("missing.csv failed", output)
+        self.assertRaises(ValueError, run, [pjoin(directory, "offset.csv"), pjoin(directory, "out", "..", "offset.csv")])
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_to_columns(self):
+        schema = {'Preis': tablereader.decimal_comma, 'Gewicht': tablereader.decimal_comma}
+        for filename, kwargs in (("test_simple.xls", {}),
+                                 ("test_simple.xls", {"columns": ["Gewicht", "Name"]}),
+                                 ("test_simple.xlsx", {"typed": True}),
+                                 ("test_simple.xlsx", {"force_type": "xlsx-fast"}),
+                                 ("test_simple_german.csv", {"schema": schema}),
+                                 ("test_simple_german.csv", {"row_type": "tuple", "schema": schema})):
+            reader = tablereader.TableReader(pjoin(self.samplefiles_directory, filename), **kwargs)
+            columns = reader.to_columns()
+            self.assertEqual(list(columns), reader.fieldnames)
+            self.assertEqual(columns["Name"].tolist(), ["Beispiel", "Beispiel2"])
+            self.assertEqual(columns["Name"].dtype, numpy.dtype("O"))
+            self.assertEqual(columns["Gewicht"].dtype, numpy.dtype("f8"))
+            self.assertEqual(columns["Gewicht"].tolist(), [0.125, 2.5])
+            if "Artikelnummer" in columns:
+                self.assertEqual(columns["Artikelnummer"].dtype, numpy.dtype("i8"))
+                self.assertEqual(columns["Artikelnummer"].tolist(), [12345, 23456])
+            self.assertEqual(reader.line_num, 3)
+
+        records = tablereader.TableReader(pjoin(self.samplefiles_directory, "test_simple.xls")).to_numpy(dtypes={"Artikelnummer": "U5"})
+        self.assertEqual(records["Artikelnummer"].tolist(), ["12345", "23456"])
+        self.assertEqual(records[1]["Preis"], 2.48)
+
+        rows = [["1", "0.5", "x", "01"], ["2", "", "y", "02"], ["3.5", "1", "", "3"], ["4", "2", "z", "4"], ["a", "3", "", "5"],
+                ["5", "4", "", "6"]]
+        reader = tablereader.TableReader(io.StringIO(u"\n".join(";".join(row) for row in [["i", "f", "s", "z"]] + rows)),
+                                         force_type="csv")
+        columns = reader.to_columns(sample_size=2)
+        self.assertEqual(columns["i"].dtype, numpy.dtype("O"))  # int, upcast to float, upcast to object keeping the text
+        self.assertEqual(columns["i"].tolist(), ["1", "2", "3.5", "4", "a", "5"])
+        self.assertEqual(columns["f"].dtype, numpy.dtype("f8"))
+        self.assertTrue(numpy.isnan(columns["f"][1]))
+        self.assertEqual(columns["s"].tolist(), ["x", "y", "", "z", "", ""])
+        self.assertEqual(columns["z"].tolist(), ["01", "02", "3", "4", "5", "6"])  # leading zeros keep text
+        reader = tablereader.TableReader(io.StringIO(u"i\n1\nx\n"), force_type="csv")
+        self.assertRaises(ValueError, reader.to_columns, {"i": "i8"})
+        values = ["3.50", "1e3", "", "-0", "2", "x"]
+        reader = tablereader.TableReader(io.StringIO(u"\n".join(["f;n"] + [value + ";1" for value in values])), force_type="csv")
+        self.assertEqual(reader.to_columns(sample_size=2)["f"].tolist(), values)
+        builder = _columns.ColumnBuilder("typed")
+        builder.append([1, 2])
+        builder.append([2.5, None])
+        builder.append([True, datetime(2015, 12, 1)])
+        self.assertEqual([(type(value), value) for value in builder.result().tolist()],
+                         [(int, 1), (int, 2), (float, 2.5), (type(None), None), (bool, True), (datetime, datetime(2015, 12, 1))])
+
+    def test_row_index(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = pjoin(directory, "rows.csv")
+        content = 'a;b\n' + "".join('%d;" text %d "\n' % (i, i) for i in range(10))
+        content = content.replace('5;" text 5 "', '5;"two\nlines"') + '\n10;last\n'
+        with open(filename, "w") as filehandle:
+            filehandle.write(content)
+        expected_result = list(tablereader.TableReader(filename))
+        self.assertEqual(len(expected_result), 11)
+
+        for kwargs in ({}, {"force_type": "unicodecsv"}):
+            reader = tablereader.TableReader(filename, **kwargs)
+            self.assertEqual(reader.build_index(every=3), 11)
+            self.assertTrue(os.path.exists(filename + tablereader.INDEX_SUFFIX))
+            for row in (7, 0, 5, 10, 6, -1):
+                self.assertEqual(reader[row], expected_result[row])
+            self.assertEqual(reader.line_num, 14)
+            self.assertEqual(reader[2:9:3], expected_result[2:9:3])
+            self.assertEqual(reader[8:2], [])
+            reader.seek_row(9)
+            self.assertEqual(list(reader), expected_result[9:])
+            self.assertRaises(IndexError, reader.seek_row, 11)
+            reader.close()
+
+        reader = tablereader.TableReader(filename, columns=["b"], strip_whitespaces=True, row_type="tuple")
+        self.assertEqual(reader[4], ("text 4",))
+        self.assertEqual(reader[5], ("two\nlines",))
+        reader.close()
+
+        with open(filename, "a") as filehandle:
+            filehandle.write("11;appended\n")
+        reader = tablereader.TableReader(filename)
+        self.assertEqual(reader.build_index(every=3), 12)  # stale sidecar file is rebuilt
+        self.assertEqual(reader[11], {"a": "11", "b": "appended"})
+        reader.close()
+
+        with open(filename, "w") as filehandle:  # a stray quote does not start a quoted field
+            filehandle.write('a;b\n1;5" screen\n2;x\n3;"y\nz"\n4;z\n')
+        reader = tablereader.TableReader(filename)
+        self.assertEqual(reader.build_index(), 4)
+        self.assertEqual(reader[2], {"a": "3", "b": "y\nz"})
+        self.assertEqual(reader[0:4], list(tablereader.TableReader(filename)))
+        reader.close()
+
+        with open(filename, "w") as filehandle:  # unterminated quote, only the lenient C csv reader accepts it
+            filehandle.write('a;b\n1;2\n3;"4')
+        expected_result = list(tablereader.TableReader(filename))
+        reader = tablereader.TableReader(filename)
+        self.assertEqual(reader[1], expected_result[1])
+        self.assertEqual(reader[0:2], expected_result)
+        reader.close()
+        reader = tablereader.TableReader(filename, columns=["b"])
+        self.assertEqual(reader[1], {"b": "4"})
+        reader.close()
+
+        self.assertRaises(ValueError, tablereader.TableReader(filename, skip_rows=2).build_index)
+        self.assertRaises(ValueError, tablereader.TableReader(filename, use_mmap=True).build_index)
+        self.assertRaises(ValueError, tablereader.OffsetTableReader(filename, "a").build_index)
+
+    def test_workbook_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for name in ("test_simple.xls", "test_simple.xlsx"):
+            shutil.copy(pjoin(self.samplefiles_directory, name), directory)
+        xls_file, xlsx_file = pjoin(directory, "test_simple.xls"), pjoin(directory, "test_simple.xlsx")
+        cache = tablereader.WorkbookCache(max_books=1)
+        opened = []
+
+        def opener():
+            book, closer = tablereader._open_xlsx(xlsx_file)
+            opened.append(book)
+            return book, closer
+
+        first = cache.acquire(xlsx_file, "xlsx", opener)
+        self.assertIs(cache.acquire(xlsx_file, "xlsx", opener), first)
+        cache.release(first)
+        cache.release(first)
+        self.assertEqual(len(opened), 1)
+
+        first_reader = tablereader.XLSXReader(xlsx_file, workbook_cache=cache)
+        second_reader = tablereader.XLSXReader(xlsx_file, workbook_cache=cache)
+        self.assertIs(first_reader._reader, first)
+        self.assertIs(second_reader._reader, first)
+        self.assertEqual(list(first_reader), list(second_reader))
+        xls_reader = tablereader.XLReader(xls_file, workbook_cache=cache)  # evicts the xlsx book still being used
+        self.assertEqual(len(cache), 1)
+        first_reader.close()
+        second_reader.close()
+        self.assertEqual(len(list(xls_reader)), 3)
+        self.assertFalse(xls_reader._reader.sheet_loaded(0))
+        self.assertIs(tablereader.XLReader(xls_file, workbook_cache=cache)._reader, xls_reader._reader)
+        self.assertRaises(ValueError, tablereader.XLReader, xls_file, "Missing", workbook_cache=cache)
+
+        xls_reader.close()
+        cache.invalidate(xls_file)
+        self.assertEqual(len(cache), 0)
+        cache.release(cache.acquire(xlsx_file, "xlsx", opener))
+        os.utime(xlsx_file, (0, 0))
+        cache.release(cache.acquire(xlsx_file, "xlsx", opener))  # modified file, opened again
+        self.assertEqual(len(opened), 3)
+        self.assertEqual(len(cache), 1)
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
+
+        def held(filename):
+            """Whether the process holds filename open or mapped, only known where /proc tells"""
+            if not os.path.isdir("/proc/self/fd"):
+                return False
+            path = os.path.realpath(filename)
+            for fd in os.listdir("/proc/self/fd"):
+                try:
+                    if os.readlink(pjoin("/proc/self/fd", fd)) == path:
+                        return True
+                except OSError:
+                    pass
+            with open("/proc/self/maps") as filehandle:
+                return any(line.rstrip().endswith(path) for line in filehandle)
+
+        # the process-wide cache keeps no books by default, closing a reader closes its file
+        for filename in (xls_file, xlsx_file):
+            reader = tablereader.TableReader(filename)
+            next(reader)
+            self.assertTrue(held(filename) or not os.path.isdir("/proc/self/fd"))
+            reader.close()
+            self.assertEqual(len(tablereader.workbook_cache), 0)
+            self.assertFalse(held(filename))
+            self.assertEqual(tablereader.TableReader.get_sheet_names(filename), ["Blatt1"])
+            self.assertFalse(held(filename))
+
+        max_books = tablereader.workbook_cache.max_books
+        self.addCleanup(setattr, tablereader.workbook_cache, "max_books", max_books)
+        tablereader.workbook_cache.max_books = 8
+        self.assertEqual(tablereader.TableReader.get_sheet_names(xls_file), ["Blatt1"])
+        book = tablereader.XLReader(xls_file)._reader
+        self.assertIs(tablereader.XLReader(xls_file)._reader, book)
+        gc.collect()
+        self.assertEqual(tablereader.workbook_cache._in_use, {})
+        tablereader.workbook_cache.invalidate()
+
+        # books are handed back without close(), once iteration finishes or the reader is gone
+        for filename in (xls_file, xlsx_file):
+            self.assertEqual(len(list(tablereader.TableReader(filename))), 2)
+            self.assertEqual(tablereader.workbook_cache._in_use, {})
+            reader = tablereader.TableReader(filename)
+            next(reader)
+            self.assertEqual(len(tablereader.workbook_cache._in_use), 1)
+            del reader
+            gc.collect()
+            self.assertEqual(tablereader.workbook_cache._in_use, {})
+        self.assertTrue(held(xlsx_file) or not os.path.isdir("/proc/self/fd"))  # kept open for the next reader
+        tablereader.workbook_cache.invalidate()
+        self.assertFalse(held(xlsx_file))
+
+    def test_row_range(self):
+        directory = tempfile.mkdtemp()
+        try:
+            csv_file = pjoin(directory, "range.csv")
+            with open(csv_file, "w") as filehandle:
+                filehandle.write("a;b\n")
+                for number in range(10):
+                    filehandle.write('%d;"multi\nline %d"\n' % (number, number) if number == 2 else "%d;x\n" % number)
+            xlsx_file = pjoin(directory, "range.xlsx")
+            workbook = openpyxl.Workbook()
+            sheet = workbook.active
+            sheet.append(["a", "b"])
+            for number in range(10):
+                sheet.append([str(number), "x"])
+            workbook.save(xlsx_file)
+
+            for filename, kwargs in ((csv_file, {}),
+                                     (csv_file, {"force_type": "unicodecsv"}),
+                                     (csv_file, {"use_mmap": True}),
+                                     (xlsx_file, {}),
+                                     (xlsx_file, {"force_type": "xlsx-fast"}),
+                                     (xlsx_file, {"row_type": "tuple"})):
+                reader = tablereader.TableReader(filename, skip_rows=3, max_rows=4, **kwargs)
+                self.assertEqual([row["a"] for row in reader], ["3", "4", "5", "6"])
+                reader = tablereader.TableReader(filename, skip_rows=8, **kwargs)
+                self.assertEqual([row["a"] for row in reader], ["8", "9"])
+                reader = tablereader.TableReader(filename, skip_rows=20, **kwargs)
+                self.assertEqual(list(reader), [])
+                reader = tablereader.TableReader(filename, max_rows=5, where=lambda row: int(row["a"]) % 2, **kwargs)
+                self.assertEqual([row["a"] for row in reader], ["1", "3"])
+                reader = tablereader.TableReader(filename, skip_rows=1, where=lambda row: row["a"] != "5", **kwargs)
+                self.assertEqual(list(reader.iter_batches(4)), [{"a": ["1", "2", "3", "4"], "b": ["x", "multi\nline 2", "x", "x"]},
+                                                                {"a": ["6", "7", "8"], "b": ["x", "x", "x"]},
+                                                                {"a": ["9"], "b": ["x"]}]
+                                 if filename == csv_file else
+                                 [{"a": ["1", "2", "3", "4"], "b": ["x"] * 4}, {"a": ["6", "7", "8"], "b": ["x"] * 3}, {"a": ["9"], "b": ["x"]}])
+
+            with open(csv_file, "w") as filehandle:  # a stray quote does not start a quoted field
+                filehandle.write('a;b\n1;5" screen\n2;x\n3;"y\nz"\n4;z\n')
+            for kwargs in ({}, {"force_type": "unicodecsv"}, {"use_mmap": True}):
+                reader = tablereader.TableReader(csv_file, skip_rows=1, **kwargs)
+                self.assertEqual([row["a"] for row in reader], ["2", "3", "4"])
+                reader = tablereader.TableReader(csv_file, skip_rows=3, **kwargs)
+                self.assertEqual([row["a"] for row in reader], ["4"])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_offset_header_search(self):
+        import re
+        directory = tempfile.mkdtemp()
+        try:
+            csv_file = pjoin(directory, "offset.csv")
+            with open(csv_file, "w") as filehandle:
+                filehandle.write("preamble\nexported;today\n;Start;b\n;1;2\n")
+            xlsx_file = pjoin(directory, "offset.xlsx")
+            workbook = openpyxl.Workbook()
+            sheet = workbook.active
+            for row in (["preamble"], ["exported", "today"], [None, "Start", "b"], [None, "1", "2"]):
+                sheet.append(row)
+            workbook.save(xlsx_file)
+
+            for filename in (csv_file, xlsx_file):
+                for marker in ("Start", ["Begin", "Start"], re.compile("^st", re.I)):
+                    for _ in range(2):  # second open uses the remembered header offset
+                        reader = tablereader.OffsetTableReader(filename, marker)
+                        self.assertEqual([(row["Start"], row["b"]) for row in reader], [("1", "2")])
+                        self.assertEqual(reader.line_num, 4)
+                self.assertRaises(ValueError, tablereader.OffsetTableReader, filename, "Missing")
+                self.assertRaises(ValueError, tablereader.OffsetTableReader, filename, "Start", header_scan_rows=2)
+                reader = tablereader.OffsetTableReader(filename, "Start", header_scan_rows=3)
+                self.assertEqual(reader.fieldnames[1:], ["Start", "b"])
+        finally:
+            shutil.rmtree(directory)
+
+        xls_file = pjoin(self.samplefiles_directory, "test_simple.xls")
+        reader = tablereader.OffsetTableReader(xls_file, ["2.48", "Nothing"])
+        self.assertEqual(reader.fieldnames, ["Beispiel2", "23456.0", "2.48", "2.5"])
+        self.assertRaises(ValueError, tablereader.OffsetTableReader, xls_file, "Beispiel2", header_scan_rows=2)
+
+    @unittest.skipIf(PY2, "asyncio needs Python 3")
+    def test_async_reader(self):
+        import asyncio
+
+        def consume(loop, iterator):
+            items = []
+            while True:
+                try:
+                    items.append(loop.run_until_complete(iterator.__anext__()))
+                except StopAsyncIteration:
+                    return items
+
+        loop = asyncio.new_event_loop()
+        try:
+            for filename, kwargs in (("test_simple.xls", {}),
+                                     ("test_simple.xlsx", {"typed": True}),
+                                     ("test_simple_german.csv", {"columns": ["Preis", "Name"]})):
+                filename = pjoin(self.samplefiles_directory, filename)
+                expected_result = list(tablereader.TableReader(filename, **kwargs))
+                reader = tablereader.AsyncTableReader(filename, prefetch=1, chunk_size=1, **kwargs)
+                self.assertIs(loop.run_until_complete(reader.open()), reader)
+                self.assertEqual(consume(loop, reader.__aiter__()), expected_result)
+                self.assertEqual(consume(loop, reader.__aiter__()), [])
+                loop.run_until_complete(reader.aclose())
+
+                reader = tablereader.AsyncTableReader(filename, **kwargs)
+                batches = consume(loop, reader.batches(1).__aiter__())
+                self.assertEqual(batches, list(tablereader.TableReader(filename, **kwargs).iter_batches(1)))
+                loop.run_until_complete(reader.aclose())
+
+            reader = tablereader.AsyncTableReader(pjoin(self.samplefiles_directory, "test_simple.xlsx"), schema={"Name": int})
+            self.assertRaises(ValueError, consume, loop, reader)
+            self.assertRaises(ValueError, consume, loop, reader)
+            loop.run_until_complete(reader.aclose())
+
+            from concurrent.futures import ProcessPoolExecutor
+            executor = ProcessPoolExecutor(1)
+            self.addCleanup(executor.shutdown)
+            self.assertRaises(ValueError, tablereader.AsyncTableReader, filename, executor=executor)
+        finally:
+            loop.close()
+
+    def test_content_detection(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for filename in ("test_simple.xls", "test_simple.xlsx"):
+                renamed = pjoin(directory, "upload.bin")
+                shutil.copy(pjoin(self.samplefiles_directory, filename), renamed)
+                expected_result = list(tablereader.TableReader(pjoin(self.samplefiles_directory, filename)))
+                reader = tablereader.TableReader(renamed)
+                self.assertIsNone(reader.filehandle)
+                self.assertEqual(list(reader), expected_result)
+                self.assertEqual(tablereader.TableReader.get_sheet_names(renamed),
+                                 tablereader.TableReader.get_sheet_names(pjoin(self.samplefiles_directory, filename)))
+            with open(renamed, "w") as filehandle:
+                filehandle.write("a;b\n1;2\n")
+            self.assertRaises(NotImplementedError, tablereader.TableReader, renamed)
+        finally:
+            shutil.rmtree(directory)
+
+        for filename, delimiter in (("test_simple_german.csv", ";"), ("test_simple_usenglish.csv", ",")):
+            filename = pjoin(self.samplefiles_directory, filename)
+            expected_result = list(tablereader.TableReader(filename, delimiter=delimiter))
+            for kwargs in ({}, {"force_type": "unicodecsv"}, {"use_mmap": True}):
+                reader = tablereader.TableReader(filename, delimiter=None, quotechar=None, **kwargs)
+                self.assertEqual([dict(row) for row in reader], [dict(row) for row in expected_result])
+
+    def test_resume(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = pjoin(directory, "feed.csv")
+            with open(filename, "w") as filehandle:
+                filehandle.write('a;b\n1;x\n2;"multi\nline"\n3;par')
+            for kwargs in ({}, {"force_type": "unicodecsv"}, {"columns": ["b"]}):
+                reader = tablereader.TableReader(filename, resumable=True, **kwargs)
+                self.assertEqual([row["b"] for row in reader], ["x", "multi\nline"])
+                checkpoint = reader.checkpoint()
+                self.assertEqual(checkpoint["line_num"], 4)
+                self.assertEqual(checkpoint["fieldnames"], ["a", "b"])
+                reader.close()
+
+                with open(filename, "a") as filehandle:
+                    filehandle.write('tial\n4;"open')
+                reader = tablereader.TableReader.resume(filename, checkpoint, **kwargs)
+                self.assertEqual([dict(row) for row in reader], [{"a": "3", "b": "partial"} if "columns" not in kwargs else {"b": "partial"}])
+                self.assertEqual(reader.line_num, 5)
+                with open(filename, "a") as filehandle:
+                    filehandle.write('\nquote"\n')
+                self.assertEqual([row["b"] for row in reader], ["open\nquote"])  # appended data shows up on the same reader
+                checkpoint = reader.checkpoint()
+                self.assertEqual(checkpoint["line_num"], 7)
+                self.assertEqual(list(tablereader.TableReader.resume(filename, checkpoint, **kwargs)), [])
+                reader.close()
+
+                with open(filename, "w") as filehandle:
+                    filehandle.write('a;b\n1;x\n2;"multi\nline"\n3;par')
+            self.assertRaises(ValueError, tablereader.TableReader(filename).checkpoint)
+
+            with open(filename, "w") as filehandle:  # a stray quote does not start a quoted field
+                filehandle.write('a;b\n1;5" screen\n2;x\n3;y\n4;"z')
+            reader = tablereader.TableReader(filename, resumable=True)
+            self.assertEqual([row["b"] for row in reader], ['5" screen', "x", "y"])
+            with open(filename, "a") as filehandle:
+                filehandle.write('\n"\n')
+            self.assertEqual([row["b"] for row in reader], ["z\n"])
+            reader.close()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_stats(self):
+        for filename, kwargs, stages in (("test_simple.xls", {"strip_whitespaces": True}, ("open", "fetch", "stringify", "strip", "dict")),
+                                         ("test_simple.xlsx", {}, ("open", "fetch", "stringify", "dict")),
+                                         ("test_simple.xlsx", {"force_type": "xlsx-fast"}, ("open", "fetch", "stringify", "dict")),
+                                         ("test_simple_german.csv", {"row_type": "tuple"}, ("open", "fetch", "dict"))):
+            filename = pjoin(self.samplefiles_directory, filename)
+            expected_result = list(tablereader.TableReader(filename, **kwargs))
+            reports = []
+            reader = tablereader.TableReader(filename, on_stats=reports.append, **kwargs)
+            self.assertEqual(list(reader), expected_result)
+            self.assertIs(reports[-1], reader.stats)
+            self.assertEqual((reader.stats.rows, reader.stats.cells), (2, 8))
+            self.assertEqual(reader.stats.file_size, os.path.getsize(filename))
+            self.assertEqual(reader.stats.bytes_read, reader.stats.file_size)
+            for stage in stages:
+                self.assertGreater(reader.stats.timings[stage], 0, stage)
+            self.assertAlmostEqual(reader.stats.as_dict()["total"], sum(reader.stats.timings.values()))
+        self.assertIsNone(tablereader.TableReader(filename).stats)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = pjoin(directory, "large.csv")
+        with open(filename, "w") as filehandle:
+            filehandle.write("a;b\n" + "".join("%d;%s\n" % (index, "x" * 40) for index in range(30000)))
+        size = os.path.getsize(filename)
+        for kwargs in ({}, {"force_type": "unicodecsv"}, {"use_mmap": True}, {"resumable": True}, {"workers": 2}):
+            reader = tablereader.TableReader(filename, stats=True, **kwargs)
+            self.assertEqual(sum(1 for _ in reader), 30000)
+            self.assertEqual(reader.stats.bytes_read, size, kwargs)
+            reader.close()
+            self.assertEqual(reader.stats.as_dict()["bytes_read"], size)
+            if "workers" not in kwargs:  # workers parse the whole file as one chunk
+                reader = tablereader.TableReader(filename, stats=True, max_rows=10, **kwargs)
+                self.assertEqual(len(list(reader)), 10)
+                self.assertGreater(reader.stats.bytes_read, 0)
+                self.assertLess(reader.stats.bytes_read, size)
+                reader.close()